@@ -1,50 +1,35 @@
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-from config_handler import ConfigHandler
+from drive_session import get_drive_session
+from drive_sync import get_drive_sync
+from drive_cache import get_drive_cache, VERSION_FIELDS
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
+import multiprocessing
 import pandas as pd
 import io
-import os.path
-import pickle
+import os
+
+# Concurrent Drive downloads, and processes parsing the downloaded spreadsheets
+MAX_DOWNLOAD_WORKERS = 8
+MAX_PARSE_WORKERS = min(4, os.cpu_count() or 1)
+# Each parser process is spawned and re-imports the app (Qt, Drive clients,
+# pandas), about a second per process; below these sizes the spreadsheets
+# are parsed in the download threads instead (see benchmarks.py)
+PROCESS_PARSE_MIN_FILES = 8
+PROCESS_PARSE_MIN_BYTES = 32 * 1024 * 1024
 
 class DriveDataHandler:
     def __init__(self):
-        self.SCOPES = [
-            'https://www.googleapis.com/auth/drive.readonly',
-            'https://www.googleapis.com/auth/drive.file',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        self.creds = None
-        self.service = None
-        self.config = ConfigHandler()
-        
+        self.session = get_drive_session()
+        self.config = self.session.config
+
+    @property
+    def service(self):
+        """Drive client for the calling thread."""
+        return self.session.drive()
+
     def authenticate(self):
-        """Authenticate with Google Drive using configs."""
-        token_path = self.config.get_token_path()
-        
-        # Check if token exists
-        if os.path.exists(token_path):
-            with open(token_path, 'rb') as token:
-                self.creds = pickle.load(token)
-                
-        # If credentials are invalid or don't exist, get new ones
-        if not self.creds or not self.creds.valid:
-            if self.creds and self.creds.expired and self.creds.refresh_token:
-                self.creds.refresh(Request())
-            else:
-                credentials_path = self.config.get_credentials_path()
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    credentials_path, self.SCOPES)
-                self.creds = flow.run_local_server(port=0)
-                
-            # Save the credentials
-            with open(token_path, 'wb') as token:
-                pickle.dump(self.creds, token)
-
-        self.service = build('drive', 'v3', credentials=self.creds)
-        return True
+        """Authenticate with Google Drive using the shared session."""
+        return self.session.authenticate()
 
     def get_folder_files(self):
         """Get all files from configured folder."""
@@ -52,16 +37,8 @@ class DriveDataHandler:
             folder_id = self.config.get_main_folder_id()
             # print(f"Folder ID: {folder_id}")
             
-            query = f"parents='{folder_id}' and trashed=false"
-            
-            results = self.service.files().list(
-                q=query,
-                spaces='drive',
-                fields="files(id, name, mimeType, fileExtension)",
-                pageSize=1000
-            ).execute()
-            
-            files = results.get('files', [])
+            # Mirrored locally, only changes since the last run are fetched
+            files = get_drive_sync().folder_files(self.service, folder_id)
             return files
             
         except Exception as e:
@@ -80,45 +57,204 @@ class DriveDataHandler:
         }
         return mime_type in excel_mime_types or mime_type.endswith('.xlsx') or mime_type.endswith('.xls')
 
-    def read_excel_direct(self, file_id):
+    def download_spreadsheet(self, file_id, file_metadata=None):
+        """Return the raw bytes of an Excel file, or of a Google Sheet exported as Excel.
+
+        file_metadata is the entry from the folder listing; when given, no
+        extra metadata request is made and unchanged files are read from the
+        local cache.
+        """
+        # Get file metadata
+        if file_metadata is None:
+            file_metadata = self.service.files().get(
+                fileId=file_id,
+                fields=f"id, name, mimeType, {VERSION_FIELDS}"
+            ).execute()
+        mime_type = file_metadata['mimeType']
+
+        if mime_type == 'application/vnd.google-apps.spreadsheet':
+            # Handle Google Sheets - export as Excel
+            export_mime_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        else:
+            # Handle regular Excel files
+            export_mime_type = None
+
+        # Download the file content, unless this version is cached
+        return get_drive_cache().fetch(self.service, file_metadata, export_mime_type)
+
+    def read_excel_direct(self, file_id, file_metadata=None):
         """Read Excel file or Google Sheet directly."""
         try:
-            # Get file metadata
-            file_metadata = self.service.files().get(fileId=file_id).execute()
-            mime_type = file_metadata['mimeType']
-
-            # Create file stream
-            file_stream = io.BytesIO()
-
-            if mime_type == 'application/vnd.google-apps.spreadsheet':
-                # Handle Google Sheets - export as Excel
-                request = self.service.files().export_media(
-                    fileId=file_id,
-                    mimeType='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                )
-            else:
-                # Handle regular Excel files
-                request = self.service.files().get_media(fileId=file_id)
-
-            # Download the file content
-            downloader = MediaIoBaseDownload(file_stream, request)
-            done = False
-            while not done:
-                _, done = downloader.next_chunk()
-
-            # Read the spreadsheet data
-            file_stream.seek(0)
-            df = pd.read_excel(file_stream)
-            return df
+            content = self.download_spreadsheet(file_id, file_metadata)
+            return parse_spreadsheet(content)
 
         except Exception as e:
             print(f"Error reading spreadsheet: {str(e)}")
             return None
 
-def main():
+def parse_spreadsheet(content):
+    """Parse spreadsheet bytes into a DataFrame.
+
+    Module-level so it can run in a worker process.
+    """
+    return pd.read_excel(io.BytesIO(content))
+
+def use_parse_processes(files):
+    """Whether a batch is big enough for parsing in worker processes to pay off.
+
+    Google Sheets have no size in their metadata and only count as files.
+    """
+    total_bytes = sum(int(file.get('size') or 0) for file in files)
+    return len(files) >= PROCESS_PARSE_MIN_FILES or total_bytes >= PROCESS_PARSE_MIN_BYTES
+
+def load_spreadsheets(handler, files):
+    """Download and parse spreadsheets concurrently.
+
+    Downloads run in a bounded thread pool. Each finished download is
+    handed to a process pool for parsing when the batch is large (see
+    use_parse_processes), otherwise it is parsed in its download thread.
+    Yields (index, file, df) in completion order, index being the position
+    of the file in files; df is None if the file could not be read.
+    """
+    if not files:
+        return
+
+    def download(file):
+        print(f"\nReading file: {file['name']}")
+        return handler.download_spreadsheet(file['id'], file)
+
+    download_workers = min(MAX_DOWNLOAD_WORKERS, len(files))
+    if not use_parse_processes(files):
+        # Small batch: parse in the download threads, no process start-up cost
+        with ThreadPoolExecutor(max_workers=download_workers) as download_pool:
+            loads = {download_pool.submit(lambda file: parse_spreadsheet(download(file)), file): index
+                     for index, file in enumerate(files)}
+            try:
+                for future in as_completed(loads):
+                    index = loads[future]
+                    try:
+                        df = future.result()
+                    except Exception as e:
+                        print(f"Error reading spreadsheet: {str(e)}")
+                        df = None
+                    yield index, files[index], df
+            finally:
+                # Closed early (e.g. loading was stopped): drop the queued downloads
+                for future in loads:
+                    future.cancel()
+        return
+
+    # spawn, not fork: the GUI process already runs Qt and Drive client threads
+    process_context = multiprocessing.get_context('spawn')
+    parse_workers = min(MAX_PARSE_WORKERS, len(files))
+
+    with ThreadPoolExecutor(max_workers=download_workers) as download_pool, \
+            ProcessPoolExecutor(max_workers=parse_workers, mp_context=process_context) as parse_pool:
+        downloads = {download_pool.submit(download, file): index for index, file in enumerate(files)}
+        parses = {}
+        pending = set(downloads)
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in downloads:
+                        # Download finished, hand the bytes to a parser process
+                        index = downloads[future]
+                        try:
+                            parse_future = parse_pool.submit(parse_spreadsheet, future.result())
+                        except Exception as e:
+                            print(f"Error reading spreadsheet: {str(e)}")
+                            yield index, files[index], None
+                            continue
+                        parses[parse_future] = index
+                        pending.add(parse_future)
+                    else:
+                        index = parses[future]
+                        try:
+                            df = future.result()
+                        except Exception as e:
+                            print(f"Error reading spreadsheet: {str(e)}")
+                            df = None
+                        yield index, files[index], df
+        finally:
+            # Closed early (e.g. loading was stopped): drop the queued work
+            for future in pending:
+                future.cancel()
+
+class Sample(namedtuple('Sample', ['project_code', 'inhouse_name', 'original_name'])):
+    """One row of the sample sheet."""
+    __slots__ = ()
+
+    @property
+    def display_name(self):
+        """'Inhouse Sample Name (Original Sample Name)', as shown and reported."""
+        return f"{self.inhouse_name} ({self.original_name})"
+
+def extract_samples(df):
+    """Return a Sample record for every row of a sample sheet."""
+    return list(map(Sample._make, zip(df['Project Code'].astype(str),
+                                      df['Inhouse Sample Name'],
+                                      df['Original Sample Name'])))
+
+def build_sample_index(samples, index=None):
+    """Group Sample records by exact project code, keeping their order.
+
+    Pass an existing index to add more samples to it.
+    """
+    index = {} if index is None else index
+    for sample in samples:
+        index.setdefault(sample.project_code, []).append(sample)
+    return index
+
+def extract_poi(df):
+    """Return the in-house 'Person (email)' and client 'Person' lists of a POI sheet."""
+    company = df['company'].str.lower()
+    epidote = df[company == 'epidote']
+    client = df[company == 'client']
+    return (epidote['Person'] + ' (' + epidote['email'] + ')').tolist(), client['Person'].tolist()
+
+def extract_spreadsheet_data(file_name, df):
+    """Pull the left panel lists out of one spreadsheet, based on its file name.
+
+    df may be None for a file that could not be read, giving empty lists.
+    """
+    data = {
+        'project_codes': [],
+        'samples': [],
+        'references': [],
+        'poi_epidote': [],
+        'poi_client': [],
+    }
+    name = file_name.lower()
+
+    if df is None:
+        return data
+
+    if 'sample' in name:
+        data['samples'] = extract_samples(df)
+        # Unique project codes in order of first appearance
+        data['project_codes'] = df['Project Code'].astype(str).drop_duplicates().tolist()
+
+    elif 'reference' in name:
+        # Assuming references are in a column named 'Reference'
+        if 'References' in df.columns:
+            data['references'] = df['References'].tolist()
+
+    elif 'poi' in name:
+        data['poi_epidote'], data['poi_client'] = extract_poi(df)
+
+    return data
+
+def main(on_file_loaded=None):
+    """Load the left panel lists from the spreadsheets in the main folder.
+
+    Samples are returned as Sample records. on_file_loaded, if given, is
+    called as on_file_loaded(data, loaded, total) each time a spreadsheet
+    finishes, data being the lists extracted from that file alone.
+    """
     # Initialize lists to store data
     project_code_list = []
-    sample_name_list = []
+    sample_list = []
     references = []
     poi_epidote_list = []
     poi_client_list = []
@@ -126,36 +262,26 @@ def main():
     handler = DriveDataHandler()
     if handler.authenticate():
         print("Authenticated successfully.")
-        files = handler.get_folder_files()
-        
-        for file in files:
-            if handler.is_excel_file(file['mimeType']):
-                print(f"\nReading file: {file['name']}")
-                df = handler.read_excel_direct(file['id'])
-                
-                if df is not None:
-                    # Process different files based on their names
-                            
-                    if 'sample' in file['name'].lower():
-                        for i,row in df.iterrows():
-                            sample_name_list.append(row['Inhouse Sample Name'] + ' ('+ row['Original Sample Name'] + ')' )  # Assuming 'Sample Name' is a column in the DataFrame
-                        project_code_list.extend(list(set(df['Project Code'])))
-                            
-                    elif 'reference' in file['name'].lower():
-                        # Assuming references are in a column named 'Reference'
-                        if 'References' in df.columns:
-                            references.extend(df['References'].tolist())
-
-                    elif 'poi' in file['name'].lower():
-                        for i,row in df.iterrows():
-                            if row['company'].lower() == 'epidote':
-                                poi_epidote_list.append(row['Person'] + ' (' + row['email'] +')')
-                            elif row['company'].lower() == 'client':
-                                poi_client_list.append(row['Person'])            
-
-        return project_code_list, sample_name_list, references,poi_epidote_list, poi_client_list
+        files = [file for file in handler.get_folder_files()
+                 if handler.is_excel_file(file['mimeType'])]
+
+        # Files finish in any order, merge them in listing order
+        results = [None] * len(files)
+        for loaded, (index, file, df) in enumerate(load_spreadsheets(handler, files), 1):
+            results[index] = extract_spreadsheet_data(file['name'], df)
+            if on_file_loaded is not None:
+                on_file_loaded(results[index], loaded, len(files))
+
+        for data in results:
+            project_code_list.extend(data['project_codes'])
+            sample_list.extend(data['samples'])
+            references.extend(data['references'])
+            poi_epidote_list.extend(data['poi_epidote'])
+            poi_client_list.extend(data['poi_client'])
+
+        return project_code_list, sample_list, references,poi_epidote_list, poi_client_list
 
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
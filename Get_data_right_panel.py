@@ -1,104 +1,63 @@
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
-from config_handler import ConfigHandler
+from googleapiclient.http import MediaIoBaseUpload
+from drive_session import get_drive_session
 from fpdf.fpdf import FPDF  
+from template_repository import get_template_repository
+from drive_sync import get_drive_sync
 from datetime import datetime
 import markdown
 import html2text
-import os
-import pickle
-import io
 
 class RightPanelHandler:
     def __init__(self):
-        self.SCOPES = [
-            'https://www.googleapis.com/auth/drive.readonly',
-            'https://www.googleapis.com/auth/drive.file',
-            'https://www.googleapis.com/auth/drive',
-            'https://www.googleapis.com/auth/documents'
-        ]
-        self.creds = None
-        self.drive_service = None  # Changed from self.service
-        self.docs_service = None
-        self.config = ConfigHandler()
+        self.session = get_drive_session()
+        self.config = self.session.config
+
+    @property
+    def drive_service(self):
+        """Drive client for the calling thread."""
+        return self.session.drive()
+
+    @property
+    def docs_service(self):
+        """Docs client for the calling thread."""
+        return self.session.docs()
 
     def authenticate(self):
         """Authenticate with Google Drive and Docs APIs."""
         try:
-            token_path = self.config.get_token_path()
-            
-            if os.path.exists(token_path):
-                with open(token_path, 'rb') as token:
-                    self.creds = pickle.load(token)
-
-            # If credentials are invalid or don't exist, get new ones
-            if not self.creds or not self.creds.valid:
-                if self.creds and self.creds.expired and self.creds.refresh_token:
-                    self.creds.refresh(Request())
-                else:
-                    credentials_path = self.config.get_credentials_path()
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        credentials_path, self.SCOPES)
-                    self.creds = flow.run_local_server(port=0)
-
-                # Save the credentials
-                with open(token_path, 'wb') as token:
-                    pickle.dump(self.creds, token)
-
-            # Initialize both services
-            self.drive_service = build('drive', 'v3', credentials=self.creds)
-            self.docs_service = build('docs', 'v1', credentials=self.creds)
-            
-            return True
-
+            return self.session.authenticate()
         except Exception as e:
             print(f"Authentication error: {str(e)}")
             return False
         
-    def get_template_content(self, filename, file_id):
+    def fetch_template_content(self, file_id, file_metadata=None):
+        """
+        Return the content of a template file from Google Drive, raising on errors.
+
+        Served by the shared TemplateRepository, so templates already
+        previewed or used in a report are not downloaded again.
+        """
+        return get_template_repository().get_content(file_id, file_metadata)
+
+    def get_template_content(self, filename, file_id, file_metadata=None):
         """
-        Download and return the content of a template file from Google Drive.
+        Download and return the content of a template file from Google Drive,
+        or None if it could not be downloaded.
         """
         try:
-            # Ensure authentication
-            if not self.drive_service:
-                self.authenticate()
-
-            # Get the template folder ID from config
-            template_folder_id = self.config.get_template_folder_id()
-
-            # Get file metadata
-            file = self.drive_service.files().get(
-                fileId=file_id, 
-                fields='name,mimeType,parents'
-            ).execute()
-
-
-            # Get content based on file type
-            if file['mimeType'] == 'application/vnd.google-apps.document':
-                content = self.drive_service.files().export(
-                    fileId=file_id,
-                    mimeType='text/plain'  # Use 'text/html' for formatting, or 'text/plain' for plain text
-                ).execute()
-                text_content = content.decode('utf-8')
-            else:
-                request = self.drive_service.files().get_media(fileId=file_id)
-                file_content = io.BytesIO()
-                downloader = MediaIoBaseDownload(file_content, request)
-                done = False
-                while not done:
-                    _, done = downloader.next_chunk()
-                text_content = file_content.getvalue().decode('utf-8')
-            # print(text_content)
-            return text_content
+            return self.fetch_template_content(file_id, file_metadata)
 
         except Exception as e:
             print(f"Error downloading template '{filename}': {str(e)}")
             return None
 
+    def prefetch_template_content(self, file_id, file_metadata=None):
+        """Start downloading a template on the bounded background pool.
+
+        Returns a Future for the fetch_template_content result or error.
+        """
+        return get_template_repository().prefetch(file_id, file_metadata)
+
     def collect_report_data(self,left_panel, middle_panel, right_panel):
         # Initialize warnings list
         warnings = []
@@ -133,10 +92,7 @@ class RightPanelHandler:
         report_data['reference'] = reference if reference != "None" else None
         
         # Check selected samples
-        selected_samples = [
-            sample for sample, checkbox in left_panel.sample_checkboxes.items()
-            if checkbox.isChecked()
-        ]
+        selected_samples = left_panel.sample_model.checked_samples()
         if not selected_samples:
             warnings.append("Please select at least one sample")
         report_data['selected_samples'] = selected_samples
@@ -147,32 +103,27 @@ class RightPanelHandler:
             warnings.append("Report title is required")
         report_data['title'] = title
         
-        # Check selected templates from middle panel
-        template_content_dict = {}       
-
-        ## Get the order of templates from the printed list as per user selection on middle panel
-        selected_template_label_text = middle_panel.sel_template_label.text().split('<br>')
-        # print(selected_template_label_text)
-
-        # Create a dictionary to map template names to their file IDs
-        # ID is obtained from user selected checkbox field in middle panel
-        # from the above order of templates, get ID for each template and get content to create dictionary
-        # dictionary contains template order number as key and content as value
-        try:
-            template_id_dict = {name: file_id for name, file_id in middle_panel.selected_templates}
-            # print(template_id_dict)
-            for i in range(len(selected_template_label_text)):
-                name = selected_template_label_text[i]
-                file_id = template_id_dict[name]
-                # print(name)
-                template_content_dict[i+1] = self.get_template_content(name, file_id)
-
-            # print(template_content_dict.keys())
-            report_data['template_content_dict'] = template_content_dict
-        except:
-            report_data['template_content_dict'] = {}
-        # print(report_data['templates'])
+        # Do not start template downloads for a report that cannot be made yet
+        if warnings:
+            return report_data, warnings
 
+        # Check selected templates from middle panel
+        # Templates in the order the user selected them on the middle panel.
+        # Start every download that was not prefetched when its template was
+        # ticked (or whose prefetch failed) so they all run concurrently;
+        # fetch_templates waits for them, off the GUI thread.
+        fetches = []
+        template_versions = []
+        for name, file_id in middle_panel.selected_templates:
+            template_versions.append((file_id, middle_panel.template_files.get(file_id, {}).get('modifiedTime')))
+            fetch = middle_panel.template_fetches.get(file_id)
+            if fetch is None or (fetch.done() and fetch.exception() is not None):
+                fetch = self.prefetch_template_content(file_id, middle_panel.template_files.get(file_id))
+                middle_panel.template_fetches[file_id] = fetch
+            fetches.append((name, file_id, fetch))
+        report_data['template_fetches'] = fetches
+        # What the templates' text depends on, for memoizing the rendered report
+        report_data['template_versions'] = template_versions
 
         # Add conclusion to report data
         report_data['conclusion'] = right_panel.conclusion_text.toPlainText()
@@ -192,4 +143,71 @@ class RightPanelHandler:
         report_data['client_appr'] = left_panel.client_poi1_dropdown.currentText()
         report_data['client_rep'] = left_panel.client_poi2_dropdown.currentText()
 
-        return report_data, warnings
\ No newline at end of file
+        return report_data, warnings
+
+    def sync_drive(self):
+        """Bring the mirrored folder listings (logos, validation data) up to date.
+
+        Called at the start of every report, so files added since the last
+        one are used; see DriveFolderSync.refresh.
+        """
+        try:
+            get_drive_sync().refresh(self.drive_service)
+        except Exception as e:
+            print(f"Error syncing Drive changes: {str(e)}")
+
+    def update_template_fetches(self, report_data, middle_panel):
+        """Download again the selected templates edited since their download started.
+
+        Compares the modifiedTime each download was started for with the one
+        in the Drive mirror, so call sync_drive first. The middle panel's
+        listing and downloads and report_data['template_versions'] are
+        updated to match.
+        """
+        try:
+            files = get_drive_sync().mirrored_files(self.config.get_template_folder_id())
+        except Exception as e:
+            print(f"Error reading the template listing: {str(e)}")
+            return
+        if files is None:
+            return
+        current_files = {file['id']: file for file in files}
+
+        fetches = []
+        template_versions = []
+        for (name, file_id, fetch), (_, modified_time) in zip(report_data['template_fetches'],
+                                                             report_data['template_versions']):
+            file = current_files.get(file_id)
+            if file is not None and file.get('modifiedTime') != modified_time:
+                fetch.cancel()
+                modified_time = file.get('modifiedTime')
+                fetch = self.prefetch_template_content(file_id, file)
+                middle_panel.template_files[file_id] = file
+                middle_panel.template_fetches[file_id] = fetch
+            fetches.append((name, file_id, fetch))
+            template_versions.append((file_id, modified_time))
+        report_data['template_fetches'] = fetches
+        report_data['template_versions'] = template_versions
+
+    def fetch_templates(self, report_data, check_cancelled=None):
+        """Wait for the template downloads started by collect_report_data.
+
+        Syncs the Drive mirror first (see sync_drive). Fills
+        report_data['template_content_dict'] and returns a warning
+        per template that could not be downloaded. check_cancelled is
+        called before each wait and may raise to stop.
+        """
+        self.sync_drive()
+
+        warnings = []
+        template_content_dict = {}
+        # dictionary contains template order number as key and content as value
+        for i, (name, _, fetch) in enumerate(report_data['template_fetches'], 1):
+            if check_cancelled:
+                check_cancelled()
+            try:
+                template_content_dict[i] = fetch.result()
+            except Exception as e:
+                warnings.append(f"Could not download template '{name}': {str(e)}")
+        report_data['template_content_dict'] = template_content_dict
+        return warnings
\ No newline at end of file
@@ -1,15 +1,34 @@
 from datetime import datetime
 import os
-import math
-import base64
-from io import BytesIO
-from googleapiclient.http import MediaIoBaseDownload
 from Get_data_middle_panel import TemplateHandler
+from report_templates import load_template, load_stylesheet
+from report_html import (FragmentWriter, write_template_content, logo_css, no_progress, ReportCancelled,
+                         STAGE_ASSETS, STAGE_PAGINATING, STAGE_RENDERING)
+from drive_sync import get_drive_sync
+from report_output import asset_url
+from report_memo import folder_versions
 
 class AD_HTMLGenerator:
+    # Placeholders this generator fills in, checked against the template at load
+    TEMPLATE_FIELDS = {
+        'css', 'dna_img', 'company_logo', 'title', 'project', 'analysis_type',
+        'reference', 'samples', 'templates', 'conclusion', 'poi_prj_coord',
+        'poi_ngs_tech', 'email_prj_coord', 'email_ngs_tech', 'poi_client_appr',
+        'poi_client_rep', 'timestamp'
+    }
+
+    TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), 'templates/adventitious_report_template.html')
+    STYLESHEET_PATH = os.path.join(os.path.dirname(__file__), 'static/ad_style.css')
+
+    @classmethod
+    def load_resources(cls):
+        """Return the compiled template and the stylesheet, read from disk only once per process."""
+        return load_template(cls.TEMPLATE_PATH, cls.TEMPLATE_FIELDS), load_stylesheet(cls.STYLESHEET_PATH)
+
     def __init__(self):
-        self.template_path = os.path.join(os.path.dirname(__file__), 'templates/adventitious_report_template.html')
-        self.stylesheet = os.path.join(os.path.dirname(__file__), 'static/ad_style.css')
+        self.template_path = self.TEMPLATE_PATH
+        self.stylesheet = self.STYLESHEET_PATH
+        self.template, self.css = self.load_resources()
         self.handler = TemplateHandler()
         if not self.handler.authenticate():
             raise Exception("Authentication failed")
@@ -20,15 +39,11 @@ class AD_HTMLGenerator:
             logo_folder = self.handler.config.get_logo_folder_id()
             logos = {}
             
-            # Query for both logos
-            query = f"parents='{logo_folder}' and mimeType contains 'image/' and trashed=false"
-            results = self.handler.service.files().list(
-                q=query,
-                fields="files(id, name, mimeType)",
-                pageSize=10
-            ).execute()
-            
-            files = results.get('files', [])
+            # Images in the logo folder, from the local mirror of its listing
+            files = [
+                file for file in get_drive_sync().folder_files(self.handler.service, logo_folder)
+                if file['mimeType'].startswith('image/')
+            ]
             if not files:
                 print("No logos found in logo folder")
                 return None
@@ -36,9 +51,9 @@ class AD_HTMLGenerator:
             # print("IMAGE FILES", files)
             # Find specific logos by name
             for file in files:
-                if 'dna' in file['name'].lower():
+                if 'dna' in file['name'].lower() and 'dna' not in logos:
                     logos['dna'] = self._download_logo(file)
-                elif 'company' in file['name'].lower():
+                elif 'company' in file['name'].lower() and 'company' not in logos:
                     logos['company'] = self._download_logo(file)
             
             return logos
@@ -47,135 +62,44 @@ class AD_HTMLGenerator:
             print(f"Error getting logos: {str(e)}")
             return None
 
+    def source_versions(self, report_data):
+        """Versions of the Drive files used besides the templates (the logos), or None if not known yet."""
+        return folder_versions(self.handler.config.get_logo_folder_id())
+
     def _download_logo(self, file):
         """Helper method to download and convert logo to base64."""
         try:
-            request = self.handler.service.files().get_media(fileId=file['id'])
-            logo_bytes = BytesIO()
-            downloader = MediaIoBaseDownload(logo_bytes, request)
-            
-            done = False
-            while not done:
-                _, done = downloader.next_chunk()
-            
-            # Return as base64 data URL
-            logo_data = base64.b64encode(logo_bytes.getvalue()).decode()
-            return f"data:{file['mimeType']};base64,{logo_data}"
+            # Data URL or exported file, see report_output.resolve_asset_mode
+            return asset_url(self.handler.service, file)
             
         except Exception as e:
             print(f"Error downloading logo {file['name']}: {str(e)}")
             return None
         
-    def create_template_content_html(self, template_dict, company_logo):
-        #Below are variables used to calcultae how many lines fit on a page
-        #Bigger line take up more rows of html, to take that into account. we need to see how many characters fit on a line
-        lines_fit_on_1_page = 40
-        characters_on_1_line = 72
-        next_section_continue_cutoff = 30
-        templates_html = ""
-
-        def add_header_logo():
-            template = "<div class='a4-container'>\n \
-                        <div class='flex-rows'>\n \
-                        <div class='page-header'>\n"
-            template += f"<img src='{company_logo}' alt='Sample Image 2' class='logo-header'>\n \
-                        </div>"
-
-            return template
-        
-        def add_footer():
-            template = "<div class='page-footer'>\n \
-                        <p style='color: gray; text-align: right;'>2020 Epidote Healthcare LLP </p>\n \
-                        </div>"
-            return template
-        
-        current_line = 0
-        # print("TEMPLATE DICT", template_dict)
-        # Iterate through the template dictionary
-        # template_dict is expected to be a dictionary with keys as template numbers and values as content
-        # Each content is expected to be a string with the first line as title and the rest as text body
-        if len(template_dict) != 0:
-            for i, content in template_dict.items():
-                content = content.strip().splitlines()  # Clean up whitespace and newlines and split into lines            
-                title,text_body = content[0].replace("Title: ", ""), content[1:]
-                # print("TITLE", title)
-                # print("TEXT BODY", text_body)
-                # text_body = text_body.replace('\n', '<br>')  # Convert newlines to <br> for HTML
-                if i == 1:
-                    templates_html += add_header_logo()
-                    templates_html += "<div class='page-body'>\n"
-                else:
-                    # Check how much space is left on the page, if there are only few lines, go to next page
-                    if current_line >= next_section_continue_cutoff:
-                        # close current template block and page body
-                        templates_html += "</div>\n</div>\n"
-                        templates_html += add_footer()
-                        # Close flex-rows and a4-container divs
-                        templates_html += "</div>\n</div>\n"
-                        templates_html += add_header_logo()
-                        templates_html += "<div class='page-body'>\n"
-                        current_line = 0  
-                    else:
-                        # Close template block of previous template
-                        templates_html += "</div>\n"
-
-                # Add title
-                templates_html += "<div class='template-title'>\n"
-                templates_html += f"<h3>{title}</h3>\n"
-                templates_html += "</div>\n"
-                current_line += 1
-
-
-                # Add line by line text body
-                templates_html += "<div class='template-block'>\n"
-                for line in text_body:
-
-                    if line.strip() == "":
-                        current_line += 1  # Empty line counts as a line
-                    else:
-                        ## Here you need to add a check if the next line that you are adding will fit the remaining space on the page
-                        # Need to calculate math.ceil(len(line) / characters_on_1_line) to see how many lines it will take
-                        # if more than remaining lines, go to next page
-                        space_needed = math.ceil(len(line) / characters_on_1_line)
-                        if current_line + space_needed < lines_fit_on_1_page:       
-                            # If it fits, add the line
-                            current_line += space_needed  
-                        else:
-                            # close current template block and page body
-                            templates_html += "</div>\n</div>\n"
-                            templates_html += add_footer()
-                            # Close flex-rows and a4-container divs
-                            templates_html += "</div>\n</div>\n"
-                            templates_html += add_header_logo()
-                            templates_html += "<div class='page-body'>\n"
-                            templates_html += "<div class='template-block'>\n"
-                            current_line = 0    
-                    templates_html += f"<p>{line}</p>\n"
-                templates_html += "<br><br>"
-                current_line += 2
-
-            #Close the last template block and page body
-            templates_html += "</div>\n</div>\n"
-            templates_html += add_footer()
-            # Close flex-rows and a4-container divs
-            templates_html += "</div>\n</div>\n"
-    
-
-        # print(templates_html)
-        return templates_html
-
-
-
-    def generate_html(self, report_data):
-        """Generate HTML content from template and report data."""
+    def create_template_content_html(self, template_dict, out=None):
+        """Return the template sections as paginated HTML.
+
+        With out (an open text file or other writer) the HTML is streamed
+        there instead and None is returned.
+        """
+        writer = FragmentWriter(out)
+        write_template_content(writer, template_dict, self.STYLESHEET_PATH)
+        return writer.getvalue()
+
+    def generate_html(self, report_data, progress=no_progress):
+        """Generate HTML content from template and report data.
+
+        progress is called with each stage as it starts, and may raise
+        ReportCancelled to stop.
+        """
         try:
             # Get both logos
+            progress(STAGE_ASSETS)
             logos = self.get_logos()
+            # Logos that failed to download, see report_memo.is_complete
+            report_data['missing_assets'] = (['logos'] if logos is None
+                                              else [name for name, logo in logos.items() if logo is None])
 
-            # Read template
-            with open(self.template_path, 'r', encoding='utf-8') as f:
-                template = f.read()
-            
             # Format samples and templates lists
             samples_html = '\n'.join([f'<a>{sample}</a>' for sample in report_data['selected_samples']])
 
@@ -184,14 +108,13 @@ class AD_HTMLGenerator:
             dna_img = logos['dna'] if logos and 'dna' in logos else ''
             
             #Get template html content with assigned div for html
-            templates_html = self.create_template_content_html(report_data['template_content_dict'],company_logo)
-
-            with open(self.stylesheet) as f:
-                css = f.read()
+            progress(STAGE_PAGINATING)
+            templates_html = self.create_template_content_html(report_data['template_content_dict'])
 
             # Replace placeholders
-            html_content = template.format(
-                css = css,
+            progress(STAGE_RENDERING)
+            html_content = self.template.render(
+                css = self.css + logo_css(company_logo),
                 dna_img = dna_img,
                 company_logo=company_logo,
                 title=report_data['title'],
@@ -211,7 +134,9 @@ class AD_HTMLGenerator:
             )
             # print(html_content)
             return html_content
-            
+
+        except ReportCancelled:
+            raise
         except Exception as e:
             print(f"Error generating HTML: {str(e)}")
             return None
\ No newline at end of file
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from drive_cache import get_drive_cache, DriveFileCache
+import base64
+import threading
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class AssetCache:
+    """In-memory cache of report assets (logos, QC plots) for the session.
+
+    Holds the downloaded bytes of each file version and, once asked for, its
+    base64 data URL, so repeated reports neither download nor re-encode the
+    same images. Shared by all report generators; the least recently used
+    entries are dropped once their total size exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (kind, file_id, version) -> bytes or str
+        self._total_bytes = 0
+
+    def _get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            return None
+
+    def _put(self, key, value):
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= len(self._entries.pop(key))
+            self._entries[key] = value
+            self._total_bytes += len(value)
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+
+    def get_bytes(self, service, file):
+        """Return the content of a Drive file, from memory when this version was seen before."""
+        key = ('bytes', file['id'], DriveFileCache.file_version(file))
+        data = self._get(key)
+        if data is None:
+            data = get_drive_cache().fetch(service, file)
+            self._put(key, data)
+        return data
+
+    def data_url(self, service, file):
+        """Return a file as a base64 data URL, encoding each version only once."""
+        key = ('data_url', file['id'], DriveFileCache.file_version(file))
+        url = self._get(key)
+        if url is None:
+            data = base64.b64encode(self.get_bytes(service, file)).decode()
+            url = f"data:{file['mimeType']};base64,{data}"
+            self._put(key, url)
+        return url
+
+
+_assets = None
+_assets_lock = threading.Lock()
+
+
+def get_asset_cache():
+    """Return the process-wide AssetCache, creating it on first use."""
+    global _assets
+    with _assets_lock:
+        if _assets is None:
+            _assets = AssetCache()
+        return _assets
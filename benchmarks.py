@@ -0,0 +1,291 @@
+"""Micro-benchmarks for the report builder's hot paths.
+
+Run with: python benchmarks.py
+"""
+import io
+import math
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import timeit
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import Get_data_left_panel as gd
+from report_html import FragmentWriter, write_template_content, logo_css
+from pagination import PageLayout
+
+# Stylesheet the template pages are measured against (the DNA Genome Integrity report's)
+STYLESHEET_PATH = os.path.join(os.path.dirname(__file__), 'static/dnagi_style.css')
+
+
+def make_sample_sheet(rows):
+    """Synthetic sample sheet shaped like the one in the main Drive folder."""
+    rng = np.random.default_rng(0)
+    projects = np.array([f"PRJ{n:03d}" for n in range(200)])
+    project_codes = projects[rng.integers(0, len(projects), rows)]
+    return pd.DataFrame({
+        'Project Code': project_codes,
+        'Inhouse Sample Name': [f"{code}_S{n}" for n, code in enumerate(project_codes)],
+        'Original Sample Name': [f"client_sample_{n}" for n in range(rows)],
+    })
+
+
+def make_poi_sheet(rows):
+    """Synthetic POI sheet with a mix of company values and capitalisations."""
+    rng = np.random.default_rng(0)
+    companies = np.array(['Epidote', 'epidote', 'Client', 'CLIENT', 'Other'])
+    return pd.DataFrame({
+        'company': companies[rng.integers(0, len(companies), rows)],
+        'Person': [f"Person {n}" for n in range(rows)],
+        'email': [f"person{n}@example.com" for n in range(rows)],
+    })
+
+
+def sample_names_iterrows(df):
+    """Previous row-by-row implementation, kept as the baseline."""
+    sample_name_list = []
+    for i,row in df.iterrows():
+        sample_name_list.append(row['Inhouse Sample Name'] + ' ('+ row['Original Sample Name'] + ')' )
+    return sample_name_list
+
+
+def poi_iterrows(df):
+    """Previous row-by-row implementation, kept as the baseline."""
+    poi_epidote_list = []
+    poi_client_list = []
+    for i,row in df.iterrows():
+        if row['company'].lower() == 'epidote':
+            poi_epidote_list.append(row['Person'] + ' (' + row['email'] +')')
+        elif row['company'].lower() == 'client':
+            poi_client_list.append(row['Person'])
+    return poi_epidote_list, poi_client_list
+
+
+def make_template_dict(lines, sections=20):
+    """Synthetic template sections with a mix of short, long and empty lines."""
+    rng = np.random.default_rng(0)
+    lengths = rng.integers(0, 300, lines)
+    body = ["" if length < 20 else "x" * length for length in lengths]
+    per_section = math.ceil(lines / sections)
+    return {n + 1: f"Title: Section {n + 1}\n" + "\n".join(body[n * per_section:(n + 1) * per_section])
+            for n in range(sections)}
+
+
+def template_content_concat(template_dict, company_logo):
+    """Previous string += implementation, kept as the baseline."""
+    #Below are variables used to calcultae how many lines fit on a page
+    #Bigger line take up more rows of html, to take that into account. we need to see how many characters fit on a line
+    lines_fit_on_1_page = 40
+    characters_on_1_line = 72
+    next_section_continue_cutoff = 30
+    templates_html = ""
+
+    def add_header_logo():
+        template = "<div class='a4-container'>\n \
+                        <div class='flex-rows'>\n \
+                        <div class='page-header'>\n"
+        template += f"<img src='{company_logo}' alt='Sample Image 2' class='logo-header'>\n \
+                        </div>"
+
+        return template
+    
+    def add_footer():
+        template = "<div class='page-footer'>\n \
+                        <p style='color: gray; text-align: right;'>2020 Epidote Healthcare LLP </p>\n \
+                        </div>"
+        return template
+    
+    current_line = 0
+    # print("TEMPLATE DICT", template_dict)
+    # Iterate through the template dictionary
+    # template_dict is expected to be a dictionary with keys as template numbers and values as content
+    # Each content is expected to be a string with the first line as title and the rest as text body
+    if len(template_dict) != 0:
+        for i, content in template_dict.items():
+            content = content.strip().splitlines()  # Clean up whitespace and newlines and split into lines            
+            title,text_body = content[0].replace("Title: ", ""), content[1:]
+            # print("TITLE", title)
+            # print("TEXT BODY", text_body)
+            # text_body = text_body.replace('\n', '<br>')  # Convert newlines to <br> for HTML
+            if i == 1:
+                templates_html += add_header_logo()
+                templates_html += "<div class='page-body'>\n"
+            else:
+                # Check how much space is left on the page, if there are only few lines, go to next page
+                if current_line >= next_section_continue_cutoff:
+                    # close current template block and page body
+                    templates_html += "</div>\n</div>\n"
+                    templates_html += add_footer()
+                    # Close flex-rows and a4-container divs
+                    templates_html += "</div>\n</div>\n"
+                    templates_html += add_header_logo()
+                    templates_html += "<div class='page-body'>\n"
+                    current_line = 0  
+                else:
+                    # Close template block of previous template
+                    templates_html += "</div>\n"
+
+            # Add title
+            templates_html += "<div class='template-title'>\n"
+            templates_html += f"<h3>{title}</h3>\n"
+            templates_html += "</div>\n"
+            current_line += 1
+
+
+            # Add line by line text body
+            templates_html += "<div class='template-block'>\n"
+            for line in text_body:
+
+                if line.strip() == "":
+                    current_line += 1  # Empty line counts as a line
+                else:
+                    ## Here you need to add a check if the next line that you are adding will fit the remaining space on the page
+                    # Need to calculate math.ceil(len(line) / characters_on_1_line) to see how many lines it will take
+                    # if more than remaining lines, go to next page
+                    space_needed = math.ceil(len(line) / characters_on_1_line)
+                    if current_line + space_needed < lines_fit_on_1_page:       
+                        # If it fits, add the line
+                        current_line += space_needed  
+                    else:
+                        # close current template block and page body
+                        templates_html += "</div>\n</div>\n"
+                        templates_html += add_footer()
+                        # Close flex-rows and a4-container divs
+                        templates_html += "</div>\n</div>\n"
+                        templates_html += add_header_logo()
+                        templates_html += "<div class='page-body'>\n"
+                        templates_html += "<div class='template-block'>\n"
+                        current_line = 0    
+                templates_html += f"<p>{line}</p>\n"
+            templates_html += "<br><br>"
+            current_line += 2
+
+        #Close the last template block and page body
+        templates_html += "</div>\n</div>\n"
+        templates_html += add_footer()
+        # Close flex-rows and a4-container divs
+        templates_html += "</div>\n</div>\n"
+
+
+    # print(templates_html)
+    return templates_html
+
+
+def template_content_writer(template_dict):
+    writer = FragmentWriter()
+    write_template_content(writer, template_dict, STYLESHEET_PATH)
+    return writer.getvalue()
+
+
+def template_fragments(template_dict):
+    """The fragments write_template_content writes for template_dict, in order."""
+    fragments = []
+    write_template_content(SimpleNamespace(write=fragments.append), template_dict, STYLESHEET_PATH)
+    return fragments
+
+
+def build_concat(fragments):
+    html = ""
+    for fragment in fragments:
+        html += fragment
+    return html
+
+
+def build_writer(fragments):
+    writer = FragmentWriter()
+    write = writer.write
+    for fragment in fragments:
+        write(fragment)
+    return writer.getvalue()
+
+
+def compare(label, baseline, candidate, repeat=3, check=True):
+    """Check both produce the same output (unless check is False), then print best-of-repeat timings."""
+    if check:
+        assert baseline() == candidate(), f"{label}: outputs differ"
+    baseline_time = min(timeit.repeat(baseline, number=1, repeat=repeat))
+    candidate_time = min(timeit.repeat(candidate, number=1, repeat=repeat))
+    print(f"{label}: {baseline_time * 1e3:.1f} ms -> {candidate_time * 1e3:.1f} ms "
+          f"({baseline_time / candidate_time:.1f}x)")
+
+
+def bench_left_panel_extraction(rows=100_000):
+    samples = make_sample_sheet(rows)
+    poi = make_poi_sheet(rows)
+    compare(f"sample names, {rows} rows",
+            lambda: sample_names_iterrows(samples),
+            lambda: [sample.display_name for sample in gd.extract_samples(samples)])
+    compare(f"POI lists, {rows} rows",
+            lambda: poi_iterrows(poi),
+            lambda: gd.extract_poi(poi))
+
+
+def bench_template_content(line_counts=(2_000, 20_000, 200_000)):
+    # A large data URL; the baseline inlined the company logo in every page header
+    company_logo = "data:image/png;base64," + "A" * 10_000
+    for lines in line_counts:
+        template_dict = make_template_dict(lines)
+        # The baseline also paginates by its old fixed line counts, so the outputs differ
+        compare(f"template HTML, {lines} lines",
+                lambda: template_content_concat(template_dict, company_logo),
+                lambda: template_content_writer(template_dict),
+                repeat=1, check=False)
+        baseline_size = len(template_content_concat(template_dict, company_logo))
+        candidate_size = len(template_content_writer(template_dict) + logo_css(company_logo))
+        print(f"  HTML size: {baseline_size / 1e6:.1f} MB -> {candidate_size / 1e6:.1f} MB")
+        # Streaming to a file handle should cost about the same per line
+        writer_time = min(timeit.repeat(
+            lambda: write_template_content(FragmentWriter(io.StringIO()), template_dict, STYLESHEET_PATH),
+            number=1, repeat=3))
+        print(f"  streamed to a file handle: {writer_time / lines * 1e6:.2f} us/line")
+
+
+def bench_html_building(line_counts=(2_000, 20_000, 200_000)):
+    # The same precomputed fragments for both, so only building the string is timed
+    for lines in line_counts:
+        fragments = template_fragments(make_template_dict(lines))
+        compare(f"HTML building, {len(fragments)} fragments",
+                lambda: build_concat(fragments),
+                lambda: build_writer(fragments))
+        writer_time = min(timeit.repeat(lambda: build_writer(fragments), number=1, repeat=3))
+        print(f"  FragmentWriter: {writer_time / len(fragments) * 1e9:.0f} ns/fragment")
+
+
+def bench_pagination(line_counts=(1_000, 10_000)):
+    rng = np.random.default_rng(0)
+    words = ['the', 'genome', 'integrity', 'of', 'sample', 'reads', 'were', 'aligned', 'to',
+             'reference', 'GRCh38', 'with', '99.7%', 'coverage', '(30x)', 'and', 'no', 'variants']
+    for lines in line_counts:
+        text = [' '.join(rng.choice(words, rng.integers(0, 80))) for _ in range(lines)]
+        layout = PageLayout(STYLESHEET_PATH)  # fresh, so word widths are measured from the tables
+        elapsed = min(timeit.repeat(lambda: [layout.paragraph_height(line) for line in text],
+                                    number=1, repeat=3))
+        print(f"pagination, {lines} lines: {elapsed * 1e3:.1f} ms")
+
+
+def bench_parse_processes(worker_counts=(1, 4), rows=200):
+    """Start-up cost of the spawn pool that parses large spreadsheet batches.
+
+    The task imports Get_data_left_panel in the worker, as parse_spreadsheet
+    does. Here __main__ is this script; in the app each worker also
+    re-imports main.py (PyQt5, QtWebEngine, docx), so the real cost is higher.
+    """
+    poi = make_poi_sheet(rows)
+    in_process = min(timeit.repeat(lambda: gd.extract_poi(poi), number=1, repeat=3))
+    print(f"in-process task, {rows} rows: {in_process * 1e3:.1f} ms")
+    for workers in worker_counts:
+        def run_pool():
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                list(pool.map(gd.extract_poi, [poi] * workers))
+        elapsed = min(timeit.repeat(run_pool, number=1, repeat=2))
+        print(f"spawn pool, {workers} workers: {elapsed * 1e3:.0f} ms")
+
+
+if __name__ == '__main__':
+    bench_left_panel_extraction()
+    bench_template_content()
+    bench_html_building()
+    bench_pagination()
+    bench_parse_processes()
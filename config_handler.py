@@ -1,9 +1,33 @@
 import os
 import json
+import threading
+from types import MappingProxyType
+
+DEFAULT_CONFIG_DIR = '/home/tanvi/Projects/Create_Report_GUI/configs'
+CONFIG_DIR_ENV_VAR = 'REPORT_GUI_CONFIG_DIR'
+
+# Set from the command line (see main.py), takes precedence over the environment
+_config_dir_override = None
+
+# Parsed folder_config.json per path: path -> (mtime, read-only mapping)
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def set_config_dir(config_dir):
+    """Override the configs directory for every ConfigHandler created afterwards."""
+    global _config_dir_override
+    _config_dir_override = config_dir
+
+
+def resolve_config_dir():
+    """Return the configs directory: CLI override, then environment, then default."""
+    return _config_dir_override or os.environ.get(CONFIG_DIR_ENV_VAR) or DEFAULT_CONFIG_DIR
+
 
 class ConfigHandler:
-    def __init__(self):
-        self.config_dir = '/home/tanvi/Projects/Create_Report_GUI/configs'
+    def __init__(self, config_dir=None):
+        self.config_dir = config_dir or resolve_config_dir()
         self.credentials_path = os.path.join(self.config_dir, 'credentials_tanvi.json')
         self.token_path = os.path.join(self.config_dir, 'token.pickle')
         self.folder_config_path = os.path.join(self.config_dir, 'folder_config.json')
@@ -16,50 +40,45 @@ class ConfigHandler:
     def get_token_path(self):
         return self.token_path
 
-    def get_main_folder_id(self):
-        if os.path.exists(self.folder_config_path):
+    def get_folder_config(self):
+        """Return a read-only snapshot of folder_config.json.
+
+        The file is parsed once and only reloaded when its mtime changes.
+        """
+        try:
+            mtime = os.stat(self.folder_config_path).st_mtime_ns
+        except FileNotFoundError:
+            raise FileNotFoundError("folder_config.json not found in configs directory")
+
+        with _snapshots_lock:
+            cached = _snapshots.get(self.folder_config_path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+
             with open(self.folder_config_path, 'r') as f:
-                config = json.load(f)
-                return config.get('main_folder_id')
-        raise FileNotFoundError("folder_config.json not found in configs directory")
-    
+                config = MappingProxyType(json.load(f))
+            _snapshots[self.folder_config_path] = (mtime, config)
+            return config
+
+    def get_main_folder_id(self):
+        return self.get_folder_config().get('main_folder_id')
 
     def get_template_folder_id(self):
         """Get template folder ID from config."""
-        if os.path.exists(self.folder_config_path):
-            with open(self.folder_config_path, 'r') as f:
-                config = json.load(f)
-                return config.get('template_id')
-        raise FileNotFoundError("folder_config.json not found in configs directory")
-    
+        return self.get_folder_config().get('template_id')
+
     def get_html_folder_id(self):
         """Get output folder ID from config."""
-        if os.path.exists(self.folder_config_path):
-            with open(self.folder_config_path, 'r') as f:
-                config = json.load(f)
-                return config.get('html_folder_id')
-        raise FileNotFoundError("folder_config.json not found in configs directory")
-    
+        return self.get_folder_config().get('html_folder_id')
+
     def get_finalreport_folder_id(self):
         """Get report folder ID from config."""
-        if os.path.exists(self.folder_config_path):
-            with open(self.folder_config_path, 'r') as f:
-                config = json.load(f)
-                return config.get('pdf_report_folder_id')
-        raise FileNotFoundError("folder_config.json not found in configs directory")
-    
+        return self.get_folder_config().get('pdf_report_folder_id')
+
     def get_logo_folder_id(self):
         """Get logo folder ID from config."""
-        if os.path.exists(self.folder_config_path):
-            with open(self.folder_config_path, 'r') as f:
-                config = json.load(f)
-                return config.get('logo_folder_id')
-        raise FileNotFoundError("folder_config.json not found in configs directory")
-    
+        return self.get_folder_config().get('logo_folder_id')
+
     def get_validation_data_folder_id(self):
-        """Get logo folder ID from config."""
-        if os.path.exists(self.folder_config_path):
-            with open(self.folder_config_path, 'r') as f:
-                config = json.load(f)
-                return config.get('validation_data_folder_id')
-        raise FileNotFoundError("folder_config.json not found in configs directory")
\ No newline at end of file
+        """Get validation data folder ID from config."""
+        return self.get_folder_config().get('validation_data_folder_id')
@@ -0,0 +1,177 @@
+from collections import OrderedDict
+from drive_session import download_file_bytes
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+CACHE_DIR_ENV_VAR = 'REPORT_GUI_CACHE_DIR'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'create_report_gui')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Metadata fields needed to key the cache, request them in every listing
+VERSION_FIELDS = 'md5Checksum, modifiedTime'
+
+
+def cache_root():
+    """Directory holding everything the app keeps between runs."""
+    return os.environ.get(CACHE_DIR_ENV_VAR) or DEFAULT_CACHE_DIR
+
+
+class DriveFileCache:
+    """On-disk cache of downloaded Drive files.
+
+    Entries are keyed by file id plus the file's version (md5Checksum, or
+    modifiedTime for Google-native files which have no checksum) as reported
+    by the listing call, so a changed file simply gets a new key. The least
+    recently used entries are evicted once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or os.path.join(cache_root(), 'files')
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = None  # key -> size, least recently used first
+        self._total_bytes = 0
+
+    @staticmethod
+    def file_version(file):
+        """Return the version string of a Drive file, or None if unknown."""
+        return file.get('md5Checksum') or file.get('modifiedTime')
+
+    @staticmethod
+    def _digest(value):
+        return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+    def _key(self, file, variant):
+        """Cache file name: digests of the file id, its version and the export variant.
+
+        The file id digest comes first so every cached version of a file can
+        be found by prefix, see invalidate.
+        """
+        version = self.file_version(file)
+        if not version:
+            return None
+        return '-'.join((self._digest(file['id']), self._digest(version),
+                         self._digest(variant or '')))
+
+    def _load_entries(self):
+        """Index the files already on disk, oldest access first."""
+        if self._entries is not None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        found.sort()
+        self._entries = OrderedDict((name, size) for _, name, size in found)
+        self._total_bytes = sum(self._entries.values())
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, key))
+            except FileNotFoundError:
+                pass
+
+    def get(self, file, variant=None):
+        """Return the cached bytes of a file version, or None on a miss."""
+        key = self._key(file, variant)
+        if key is None:
+            return None
+        with self._lock:
+            self._load_entries()
+            if key not in self._entries:
+                return None
+            path = os.path.join(self.cache_dir, key)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                self._total_bytes -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+            os.utime(path)
+            return data
+
+    def copy_to(self, file, dest_path, variant=None):
+        """Copy a cached file version to dest_path without reading it into memory.
+
+        Returns False on a miss, leaving dest_path untouched.
+        """
+        key = self._key(file, variant)
+        if key is None:
+            return False
+        with self._lock:
+            self._load_entries()
+            if key not in self._entries:
+                return False
+            path = os.path.join(self.cache_dir, key)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest_path), prefix='.')
+            os.close(fd)
+            try:
+                shutil.copyfile(path, tmp_path)
+            except FileNotFoundError:
+                os.remove(tmp_path)
+                self._total_bytes -= self._entries.pop(key)
+                return False
+            os.replace(tmp_path, dest_path)
+            self._entries.move_to_end(key)
+            os.utime(path)
+            return True
+
+    def put(self, file, data, variant=None):
+        """Store the bytes of a file version."""
+        key = self._key(file, variant)
+        if key is None or len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._load_entries()
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.cache_dir, key))
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+
+    def invalidate(self, file_id, keep_version=None):
+        """Drop the cached versions of a file, except keep_version if given."""
+        prefix = self._digest(file_id) + '-'
+        keep = keep_version and prefix + self._digest(keep_version) + '-'
+        with self._lock:
+            self._load_entries()
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                if keep and key.startswith(keep):
+                    continue
+                self._total_bytes -= self._entries.pop(key)
+                try:
+                    os.remove(os.path.join(self.cache_dir, key))
+                except FileNotFoundError:
+                    pass
+
+    def fetch(self, service, file, export_mime_type=None):
+        """Return the bytes of a Drive file, downloading only on a cache miss."""
+        data = self.get(file, export_mime_type)
+        if data is None:
+            data = download_file_bytes(service, file['id'], export_mime_type)
+            self.put(file, data, export_mime_type)
+        return data
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_drive_cache():
+    """Return the process-wide DriveFileCache, creating it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DriveFileCache()
+        return _cache
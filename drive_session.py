@@ -0,0 +1,147 @@
+from google_auth_oauthlib.flow import InstalledAppFlow
+from google.auth.transport.requests import Request
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.http import MediaIoBaseDownload
+from config_handler import ConfigHandler
+import io
+import os
+import pickle
+import threading
+
+
+class DriveSession:
+    """Process-wide owner of the Google credentials and API clients.
+
+    Credentials are loaded (and refreshed if needed) once per process and the
+    discovery documents are parsed once per API. Service objects are handed
+    out per thread because the underlying httplib2 transport is not
+    thread-safe.
+    """
+
+    SCOPES = [
+        'https://www.googleapis.com/auth/drive.readonly',
+        'https://www.googleapis.com/auth/drive.file',
+        'https://www.googleapis.com/auth/drive',
+        'https://www.googleapis.com/auth/documents'
+    ]
+
+    def __init__(self, config=None):
+        self.config = config or ConfigHandler()
+        self.creds = None
+        self._lock = threading.RLock()
+        self._documents = {}
+        self._local = threading.local()
+
+    def authenticate(self):
+        """Load, refresh or create the credentials shared by every client."""
+        with self._lock:
+            if self.creds and self.creds.valid:
+                return True
+
+            token_path = self.config.get_token_path()
+
+            if not self.creds and os.path.exists(token_path):
+                with open(token_path, 'rb') as token:
+                    self.creds = pickle.load(token)
+
+            # If credentials are invalid or don't exist, get new ones
+            if not self.creds or not self.creds.valid:
+                if self.creds and self.creds.expired and self.creds.refresh_token:
+                    self.creds.refresh(Request())
+                else:
+                    credentials_path = self.config.get_credentials_path()
+                    flow = InstalledAppFlow.from_client_secrets_file(
+                        credentials_path, self.SCOPES)
+                    self.creds = flow.run_local_server(port=0)
+
+                # Save the credentials
+                with open(token_path, 'wb') as token:
+                    pickle.dump(self.creds, token)
+
+            return True
+
+    def _discovery_document(self, api, version):
+        """Return the discovery document for an API, reading it only once."""
+        key = (api, version)
+        with self._lock:
+            if key not in self._documents:
+                self._documents[key] = discovery_cache.get_static_doc(api, version)
+            return self._documents[key]
+
+    def service(self, api, version):
+        """Return the calling thread's client for the given API."""
+        services = getattr(self._local, 'services', None)
+        if services is None:
+            services = self._local.services = {}
+
+        key = (api, version)
+        if key not in services:
+            self.authenticate()
+            document = self._discovery_document(api, version)
+            if document is not None:
+                services[key] = build_from_document(document, credentials=self.creds)
+            else:
+                services[key] = build(api, version, credentials=self.creds,
+                                      cache_discovery=False)
+        return services[key]
+
+    def drive(self):
+        """Drive v3 client for the calling thread."""
+        return self.service('drive', 'v3')
+
+    def docs(self):
+        """Docs v1 client for the calling thread."""
+        return self.service('docs', 'v1')
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_drive_session():
+    """Return the process-wide DriveSession, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = DriveSession()
+        return _session
+
+
+def download_file_bytes(service, file_id, export_mime_type=None):
+    """Download a Drive file, exporting Google-native files to export_mime_type."""
+    if export_mime_type:
+        request = service.files().export_media(fileId=file_id, mimeType=export_mime_type)
+    else:
+        request = service.files().get_media(fileId=file_id)
+
+    file_stream = io.BytesIO()
+    downloader = MediaIoBaseDownload(file_stream, request)
+    done = False
+    while not done:
+        _, done = downloader.next_chunk()
+    return file_stream.getvalue()
+
+
+def list_drive_files(service, query, file_fields='id, name, mimeType', page_size=1000):
+    """Yield the files matching a Drive query, fetching pages lazily.
+
+    Only file_fields are requested for each file. The next page is fetched
+    when the caller iterates past the current one, so stopping early saves
+    the remaining requests.
+    """
+    page_token = None
+    while True:
+        results = service.files().list(
+            q=query,
+            spaces='drive',
+            fields=f"nextPageToken, files({file_fields})",
+            pageSize=page_size,
+            pageToken=page_token
+        ).execute()
+
+        yield from results.get('files', [])
+
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return
@@ -0,0 +1,206 @@
+from drive_session import list_drive_files
+from drive_cache import cache_root, get_drive_cache, VERSION_FIELDS
+from googleapiclient.errors import HttpError
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Metadata kept for every file of a mirrored folder
+FILE_FIELDS = f"id, name, mimeType, fileExtension, size, parents, trashed, {VERSION_FIELDS}"
+# refresh() skips the sync when the mirror was synced more recently than this
+REFRESH_MAX_AGE = 10
+
+
+class DriveFolderSync:
+    """Local mirror of the listings of our configured Drive folders.
+
+    A folder is listed in full once, the first time it is asked for. After
+    that the mirror is brought up to date with the Changes API from the
+    startPageToken stored alongside it, so a refresh (or a restart) only
+    costs requests proportional to what changed in Drive.
+    """
+
+    def __init__(self, state_path=None):
+        self.state_path = state_path or os.path.join(cache_root(), 'drive_sync.json')
+        self._lock = threading.RLock()
+        self._state = None  # {'start_page_token': str, 'folders': {folder_id: {file_id: file}}}
+        self._synced = False
+        self._last_sync = None  # time.monotonic() of the last sync
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """Call listener(delta) after every sync that changed mirrored folders."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def _load_state(self):
+        if self._state is not None:
+            return
+        try:
+            with open(self.state_path, 'r') as f:
+                self._state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._state = {'start_page_token': None, 'folders': {}}
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.state_path), prefix='.')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _reset(self, service):
+        """Forget every mirrored folder and start tracking changes from now."""
+        token = service.changes().getStartPageToken().execute()['startPageToken']
+        self._state = {'start_page_token': token, 'folders': {}}
+        self._save_state()
+
+    def folder_files(self, service, folder_id):
+        """Return the metadata of every non-trashed file in a folder.
+
+        The first call in a process applies the changes made since the last
+        run before answering.
+        """
+        with self._lock:
+            self.ensure_folder(service, folder_id)
+            return list(self._state['folders'][folder_id].values())
+
+    def mirrored_files(self, folder_id):
+        """Return the mirrored files of a folder without contacting Drive.
+
+        None if the folder has not been brought up to date in this process
+        yet (see ensure_folder).
+        """
+        with self._lock:
+            if not self._synced or self._state is None or folder_id not in self._state['folders']:
+                return None
+            return list(self._state['folders'][folder_id].values())
+
+    def ensure_folder(self, service, folder_id):
+        """Make sure a folder is mirrored and up to date with this process's first sync.
+
+        Returns True if the folder had to be listed in full just now, e.g.
+        the first time it is used or after the mirror was reset, in which
+        case anything derived from its earlier contents must be rebuilt.
+        """
+        with self._lock:
+            self._load_state()
+            if not self._synced:
+                self.sync(service)
+
+            folders = self._state['folders']
+            if folder_id in folders:
+                return False
+            query = f"'{folder_id}' in parents and trashed=false"
+            folders[folder_id] = {
+                file['id']: file
+                for file in list_drive_files(service, query, file_fields=FILE_FIELDS)
+            }
+            self._save_state()
+            return True
+
+    def sync(self, service):
+        """Apply the Drive changes made since the last sync to the mirror.
+
+        Returns {folder_id: {'added': [...], 'modified': [...], 'removed': [...]}}
+        for the mirrored folders that changed.
+        """
+        with self._lock:
+            self._load_state()
+            if not self._state['start_page_token']:
+                self._reset(service)
+                self._mark_synced()
+                return {}
+
+            delta = {}
+            page_token = self._state['start_page_token']
+            try:
+                while page_token:
+                    results = service.changes().list(
+                        pageToken=page_token,
+                        spaces='drive',
+                        includeRemoved=True,
+                        pageSize=1000,
+                        fields=f"nextPageToken, newStartPageToken, "
+                               f"changes(fileId, removed, file({FILE_FIELDS}))"
+                    ).execute()
+                    for change in results.get('changes', []):
+                        self._apply_change(change, delta)
+                    page_token = results.get('nextPageToken')
+                    if 'newStartPageToken' in results:
+                        self._state['start_page_token'] = results['newStartPageToken']
+            except HttpError as e:
+                # An expired or invalid token: the mirror can no longer be trusted
+                print(f"Error syncing Drive changes, relisting folders: {str(e)}")
+                self._reset(service)
+                self._mark_synced()
+                return {}
+
+            self._mark_synced()
+            self._save_state()
+            if delta:
+                for listener in self._listeners:
+                    listener(delta)
+            return delta
+
+    def _mark_synced(self):
+        """Record a sync that succeeded; a failed one (e.g. offline) is retried on next use."""
+        self._synced = True
+        self._last_sync = time.monotonic()
+
+    def refresh(self, service, max_age=REFRESH_MAX_AGE):
+        """Sync, unless that was done less than max_age seconds ago.
+
+        Called before each report, so files added to Drive while the app is
+        running are seen; the steps of one report share a single sync.
+        Returns the delta of the sync, {} if it was skipped.
+        """
+        with self._lock:
+            if self._last_sync is not None and time.monotonic() - self._last_sync < max_age:
+                return {}
+            return self.sync(service)
+
+    def _apply_change(self, change, delta):
+        """Update the mirrored folders affected by one entry of changes.list."""
+        file_id = change['fileId']
+        file = change.get('file')
+        exists = not change.get('removed') and file is not None and not file.get('trashed')
+        parents = set(file.get('parents', [])) if exists else set()
+
+        tracked = False
+        for folder_id, files in self._state['folders'].items():
+            old = files.get(file_id)
+            if folder_id in parents:
+                files[file_id] = file
+                kind = 'added' if old is None else 'modified'
+            elif old is not None:
+                del files[file_id]
+                kind = 'removed'
+            else:
+                continue
+            tracked = True
+            delta.setdefault(folder_id, {'added': [], 'modified': [], 'removed': []})
+            delta[folder_id][kind].append(file if kind != 'removed' else old)
+
+        # Old content of our files is never requested again, free its space in the cache
+        if tracked:
+            cache = get_drive_cache()
+            if exists:
+                cache.invalidate(file_id, keep_version=cache.file_version(file))
+            else:
+                cache.invalidate(file_id)
+
+
+_sync = None
+_sync_lock = threading.Lock()
+
+
+def get_drive_sync():
+    """Return the process-wide DriveFolderSync, creating it on first use."""
+    global _sync
+    with _sync_lock:
+        if _sync is None:
+            _sync = DriveFolderSync()
+        return _sync
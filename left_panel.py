@@ -1,27 +1,132 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QComboBox, 
-                            QLabel, QCheckBox, QHBoxLayout, QGroupBox,
-                            QRadioButton, QLineEdit)
+                            QLabel, QHBoxLayout, QGroupBox,
+                            QRadioButton, QLineEdit, QProgressBar,
+                            QListView, QPushButton, QAbstractItemView)
+from PyQt5.QtCore import (Qt, QObject, QThread, pyqtSignal,
+                          QAbstractListModel, QModelIndex, QSortFilterProxyModel)
 import Get_data_left_panel as gd
+import threading
+
+
+class SampleListModel(QAbstractListModel):
+    """Checkable list of the samples of one project."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.samples = []
+        self.checked = []
+
+    def set_samples(self, samples):
+        """Show a new list of Sample records, all unchecked."""
+        self.beginResetModel()
+        self.samples = list(samples)
+        self.checked = [False] * len(self.samples)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.samples)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.samples[index.row()].display_name
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if self.checked[index.row()] else Qt.Unchecked
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.CheckStateRole:
+            return False
+        self.checked[index.row()] = value == Qt.Checked
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+    def set_rows_checked(self, rows, checked):
+        """Check or uncheck many rows, notifying views once."""
+        rows = list(rows)
+        if not rows:
+            return
+        for row in rows:
+            self.checked[row] = checked
+        self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)), [Qt.CheckStateRole])
+
+    def checked_samples(self):
+        """Display names of the checked samples, in list order."""
+        return [sample.display_name
+                for sample, checked in zip(self.samples, self.checked) if checked]
+
+
+class DataLoadCancelled(Exception):
+    """Raised in the loader thread to stop loading, see LeftPanelDataLoader.stop."""
+
+
+class LeftPanelDataLoader(QObject):
+    """Runs Get_data_left_panel.main() off the GUI thread."""
+    file_loaded = pyqtSignal(dict, int, int)  # data of one spreadsheet, loaded, total
+    loaded = pyqtSignal(tuple)  # final lists, in the order returned by gd.main()
+    failed = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Stop after the spreadsheet being read; safe to call from any thread."""
+        self._stop.set()
+
+    def on_file_loaded(self, data, loaded, total):
+        if self._stop.is_set():
+            raise DataLoadCancelled()
+        self.file_loaded.emit(data, loaded, total)
+
+    def run(self):
+        try:
+            result = gd.main(on_file_loaded=self.on_file_loaded)
+            if self._stop.is_set():
+                return
+            if result is None:
+                self.failed.emit("Google Drive authentication failed")
+            else:
+                self.loaded.emit(result)
+        except DataLoadCancelled:
+            pass
+        except Exception as e:
+            self.failed.emit(str(e))
+
 
 class LeftPanelWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setObjectName("left_panel") 
         self.init_ui()
+        self.start_data_load()
 
     def init_ui(self):
         # Create main layout
         layout = QVBoxLayout()
         self.setLayout(layout)
 
-        ## Get data from Google Drive
-        project_code_list, sample_name_list, references, company_poi, client_poi = gd.main()  # Call the main function from Get_data_left_panel
-        self.full_sample_list = sample_name_list  # Store full list
+        ## Data from Google Drive is filled in by start_data_load
+        project_code_list, references, company_poi, client_poi = [], [], [], []
+        self.samples_by_project = {}  # Sample records keyed by exact project code
 
         # Create heading label with larger font
         heading_label = QLabel("Enter Report Details")
         heading_label.setStyleSheet("font-size: 14pt; font-weight: bold;")
         layout.addWidget(heading_label)
+
+        # Shown while the spreadsheets are loading from Google Drive
+        self.load_label = QLabel("Loading data from Google Drive...")
+        self.load_progress = QProgressBar()
+        self.load_progress.setRange(0, 0)  # Busy until the file count is known
+        layout.addWidget(self.load_label)
+        layout.addWidget(self.load_progress)
         layout.addSpacing(20)
 
         # Create Report type dropdown section
@@ -74,22 +179,51 @@ class LeftPanelWidget(QWidget):
         self.sample_layout = QVBoxLayout()
         self.sample_group.setLayout(self.sample_layout)
         
-        # Initialize empty dict for checkboxes
-        self.sample_checkboxes = {}
-        
-        # Create a container widget for checkboxes
-        self.checkbox_container = QWidget()
-        self.checkbox_layout = QVBoxLayout()
-        self.checkbox_container.setLayout(self.checkbox_layout)
+        # Samples of the selected project, shown through a filter
+        self.sample_model = SampleListModel(self)
+        self.sample_filter_model = QSortFilterProxyModel(self)
+        self.sample_filter_model.setSourceModel(self.sample_model)
+        self.sample_filter_model.setFilterCaseSensitivity(Qt.CaseInsensitive)
+
+        # Create a container widget for the sample selector
+        self.sample_container = QWidget()
+        sample_container_layout = QVBoxLayout()
+        sample_container_layout.setContentsMargins(0, 0, 0, 0)
+        self.sample_container.setLayout(sample_container_layout)
+
+        self.sample_filter_input = QLineEdit()
+        self.sample_filter_input.setPlaceholderText("Filter samples...")
+        self.sample_filter_input.textChanged.connect(self.sample_filter_model.setFilterFixedString)
+        sample_container_layout.addWidget(self.sample_filter_input)
+
+        self.sample_view = QListView()
+        self.sample_view.setModel(self.sample_filter_model)
+        self.sample_view.setUniformItemSizes(True)
+        self.sample_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        sample_container_layout.addWidget(self.sample_view)
+
+        # Buttons act on the samples visible through the filter
+        sample_buttons_layout = QHBoxLayout()
+        select_all_btn = QPushButton("Select All")
+        select_all_btn.clicked.connect(lambda: self.check_visible_samples(True))
+        select_none_btn = QPushButton("Select None")
+        select_none_btn.clicked.connect(lambda: self.check_visible_samples(False))
+        select_highlighted_btn = QPushButton("Select Highlighted")
+        select_highlighted_btn.setToolTip("Shift-click or drag to highlight a range of samples")
+        select_highlighted_btn.clicked.connect(self.check_highlighted_samples)
+        sample_buttons_layout.addWidget(select_all_btn)
+        sample_buttons_layout.addWidget(select_none_btn)
+        sample_buttons_layout.addWidget(select_highlighted_btn)
+        sample_container_layout.addLayout(sample_buttons_layout)
         
-        # Add checkbox container to sample layout
-        self.sample_layout.addWidget(self.checkbox_container)
+        # Add sample selector to sample layout
+        self.sample_layout.addWidget(self.sample_container)
         
         # Add sample group to main layout
         layout.addWidget(self.sample_group)
         
-        # Hide only the checkbox container initially
-        self.checkbox_container.hide()
+        # Hide only the sample selector initially
+        self.sample_container.hide()
 
         # Create Report Title section
         layout.addSpacing(20) 
@@ -154,33 +288,104 @@ class LeftPanelWidget(QWidget):
         # self.transcriptome_radio.toggled.connect(self.on_analysis_changed)
         # self.reference_combo.currentIndexChanged.connect(self.on_reference_changed)
 
+    def data_widgets(self):
+        """Widgets filled from Google Drive, disabled while loading."""
+        return [self.project_combo, self.reference_combo, self.poi1_dropdown,
+                self.poi2_dropdown, self.client_poi1_dropdown, self.client_poi2_dropdown]
+
+    def start_data_load(self):
+        """Load projects, samples, references and POIs on a background thread."""
+        for widget in self.data_widgets():
+            widget.setEnabled(False)
+
+        self.load_thread = QThread(self)
+        self.data_loader = LeftPanelDataLoader()
+        self.data_loader.moveToThread(self.load_thread)
+        self.load_thread.started.connect(self.data_loader.run)
+        self.data_loader.file_loaded.connect(self.on_file_loaded)
+        self.data_loader.loaded.connect(self.on_data_loaded)
+        self.data_loader.failed.connect(self.on_data_load_failed)
+        self.data_loader.loaded.connect(self.load_thread.quit)
+        self.data_loader.failed.connect(self.load_thread.quit)
+        self.load_thread.finished.connect(self.data_loader.deleteLater)
+        self.load_thread.start()
+
+    def stop_data_load(self):
+        """Stop the loader thread, if still running, and wait for it to finish.
+
+        Called when the window closes: destroying a running QThread aborts
+        the process. Spreadsheets already downloading are finished first.
+        """
+        if self.load_thread.isRunning():
+            self.data_loader.stop()
+            self.load_thread.quit()
+            self.load_thread.wait()
+
+    def on_file_loaded(self, data, loaded, total):
+        """Add the lists of one finished spreadsheet to the widgets."""
+        self.load_progress.setRange(0, total)
+        self.load_progress.setValue(loaded)
+        self.project_combo.addItems(data['project_codes'])
+        gd.build_sample_index(data['samples'], self.samples_by_project)
+        self.reference_combo.addItems(data['references'])
+        for dropdown in (self.poi1_dropdown, self.poi2_dropdown):
+            dropdown.addItems(data['poi_epidote'])
+        for dropdown in (self.client_poi1_dropdown, self.client_poi2_dropdown):
+            dropdown.addItems(data['poi_client'])
+
+    def on_data_loaded(self, result):
+        """Replace the progressively filled lists with the final, ordered ones."""
+        project_code_list, sample_list, references, company_poi, client_poi = result
+        self.samples_by_project = gd.build_sample_index(sample_list)
+
+        for combo, items in ((self.project_combo, project_code_list),
+                             (self.reference_combo, references),
+                             (self.poi1_dropdown, company_poi),
+                             (self.poi2_dropdown, company_poi),
+                             (self.client_poi1_dropdown, client_poi),
+                             (self.client_poi2_dropdown, client_poi)):
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItems(['None'] + items)
+            combo.blockSignals(False)
+            combo.setEnabled(True)
+
+        self.load_label.hide()
+        self.load_progress.hide()
+
+    def on_data_load_failed(self, message):
+        self.load_label.setText(f"Failed to load data from Google Drive: {message}")
+        self.load_progress.hide()
+        for widget in self.data_widgets():
+            widget.setEnabled(True)
+
     def on_project_changed(self, index):
         project_code = self.project_combo.currentText()
         # print(f"Selected project: {project_code}")
         
-        # Clear existing checkboxes
-        for checkbox in self.sample_checkboxes.values():
-            self.checkbox_layout.removeWidget(checkbox)
-            checkbox.deleteLater()
-        self.sample_checkboxes.clear()
-        
         if project_code != "None":
-            # Filter samples that start with the project code
-            filtered_samples = [
-                sample for sample in self.full_sample_list 
-                if sample.startswith(project_code)
-            ]
-            
-            # Create new checkboxes for filtered samples
-            for sample_name in filtered_samples:
-                checkbox = QCheckBox(sample_name)
-                self.sample_checkboxes[sample_name] = checkbox
-                self.checkbox_layout.addWidget(checkbox)
-                # checkbox.stateChanged.connect(self.on_sample_changed)
-            
-            self.checkbox_container.show()
+            # Samples recorded under exactly this project code
+            self.sample_model.set_samples(self.samples_by_project.get(project_code, []))
+            self.sample_container.show()
         else:
-            self.checkbox_container.hide()
+            self.sample_model.set_samples([])
+            self.sample_container.hide()
+
+    def check_visible_samples(self, checked):
+        """Check or uncheck every sample that passes the filter."""
+        rows = [
+            self.sample_filter_model.mapToSource(self.sample_filter_model.index(row, 0)).row()
+            for row in range(self.sample_filter_model.rowCount())
+        ]
+        self.sample_model.set_rows_checked(rows, checked)
+
+    def check_highlighted_samples(self):
+        """Check the samples highlighted in the list, e.g. a shift-click range."""
+        rows = [
+            self.sample_filter_model.mapToSource(index).row()
+            for index in self.sample_view.selectionModel().selectedIndexes()
+        ]
+        self.sample_model.set_rows_checked(rows, True)
 
     # def on_sample_changed(self, state):
     #     checkbox = self.sender()
@@ -1,10 +1,13 @@
 import sys
+import argparse
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, 
                             QDesktopWidget, QSplitter, QScrollArea, QVBoxLayout)
 from PyQt5.QtCore import Qt
 from left_panel import LeftPanelWidget
 from middle_panel import MiddlePanelWidget
 from right_panel import RightPanelWidget
+import config_handler
+import report_output
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -65,9 +68,38 @@ class MainWindow(QMainWindow):
         # Store references for later use
         self.scroll_layout = scroll_layout
         self.scroll_content = scroll_content
+        self.left_panel = left_panel
+        self.right_panel = right_panel
+
+    def closeEvent(self, event):
+        # Background threads must finish before their QThread objects are destroyed
+        self.left_panel.stop_data_load()
+        self.right_panel.stop_report_job()
+        super().closeEvent(event)
+
+def parse_args(argv):
+    """Parse our own options, leaving the rest for Qt."""
+    parser = argparse.ArgumentParser(description="Report Maker")
+    parser.add_argument(
+        '--config-dir',
+        help=f"directory holding credentials, token and folder_config.json "
+             f"(default: ${config_handler.CONFIG_DIR_ENV_VAR} or {config_handler.DEFAULT_CONFIG_DIR})"
+    )
+    parser.add_argument(
+        '--asset-mode', choices=report_output.ASSET_MODES,
+        help=f"inline images as data URLs, or write them to an assets directory next to the report "
+             f"(default: ${report_output.ASSET_MODE_ENV_VAR} or {report_output.INLINE})"
+    )
+    return parser.parse_known_args(argv[1:])
 
 def main():
-    app = QApplication(sys.argv)
+    args, qt_args = parse_args(sys.argv)
+    if args.config_dir:
+        config_handler.set_config_dir(args.config_dir)
+    if args.asset_mode:
+        report_output.set_asset_mode(args.asset_mode)
+
+    app = QApplication(sys.argv[:1] + qt_args)
     window = MainWindow()
     window.show()
     sys.exit(app.exec_())
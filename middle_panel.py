@@ -4,9 +4,9 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QCheckBox,
                             QScrollArea, QSizePolicy)
 from PyQt5.QtCore import Qt
 from Get_data_middle_panel import TemplateHandler
-from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
+from template_repository import get_template_repository
+from googleapiclient.http import MediaIoBaseUpload
 from datetime import datetime
-import io
 
 
 class PreviewDialog(QDialog):
@@ -38,6 +38,9 @@ class MiddlePanelWidget(QWidget):
         self.setObjectName("middle_panel") 
         self.handler = TemplateHandler()  # Create single instance        
         self.selected_templates = []  # Initialize selected_templates list
+        self.template_files = {}  # Listing metadata of each template, by file ID
+        self.template_repository = get_template_repository()
+        self.template_fetches = {}  # Content downloads of ticked templates, by file ID
         self.init_ui()
         self.load_documents()
 
@@ -77,6 +80,9 @@ class MiddlePanelWidget(QWidget):
         self.template_layout = QVBoxLayout(self.template_container)
         self.template_container.setLayout(self.template_layout)
 
+        # Keep checkboxes at the top, they are inserted before this stretch
+        self.template_layout.addStretch()
+
         # Set container in scroll area
         scroll_area.setWidget(self.template_container)
         
@@ -91,7 +97,7 @@ class MiddlePanelWidget(QWidget):
         
         # Add refresh button
         refresh_btn = QPushButton("Refresh Templates")
-        refresh_btn.clicked.connect(self.load_documents)
+        refresh_btn.clicked.connect(self.refresh_documents)
         layout.addWidget(refresh_btn) 
         # layout.addSpacing(20) 
 
@@ -116,50 +122,61 @@ class MiddlePanelWidget(QWidget):
         layout.addStretch()
 
     def load_documents(self):
-        """Load document files from Google Drive template folder"""
+        """Load document files from Google Drive template folder.
+
+        Checkboxes are only added, removed or renamed for templates that
+        changed, so ticked templates stay ticked.
+        """
         if self.handler.authenticate():
             files = self.handler.get_template_files()
-            
-            # Clear existing checkboxes
-            for checkbox in self.template_checkboxes.values():
-                checkbox.deleteLater()
-            self.template_checkboxes.clear()
-            
-            # Add template files as checkboxes
+            old_files = self.template_files
+            self.template_files = {file['id']: file for file in files}
+
+            # Downloads of templates that changed since they were ticked are stale
+            for file_id in list(self.template_fetches):
+                old_file, new_file = old_files.get(file_id), self.template_files.get(file_id)
+                if new_file is None or old_file is None or old_file.get('modifiedTime') != new_file.get('modifiedTime'):
+                    self.template_fetches.pop(file_id).cancel()
+                    if new_file is not None and file_id in self.template_checkboxes \
+                            and self.template_checkboxes[file_id].isChecked():
+                        self.prefetch_template(file_id)
+
+            # Remove checkboxes of templates no longer in the folder
+            for file_id in list(self.template_checkboxes):
+                if file_id not in self.template_files:
+                    checkbox = self.template_checkboxes.pop(file_id)
+                    checkbox.setChecked(False)
+                    self.template_layout.removeWidget(checkbox)
+                    checkbox.deleteLater()
+
+            # Add new template files as checkboxes, and follow renames
             for file in files:
-                checkbox = QCheckBox(file['name'])
-                checkbox.setObjectName(file['id'])
-                checkbox.stateChanged.connect(self.on_checkbox_changed)
-                self.template_checkboxes[file['id']] = checkbox
-                self.template_layout.addWidget(checkbox)
-            
-            # Add stretch at the end
-            self.template_layout.addStretch()
+                checkbox = self.template_checkboxes.get(file['id'])
+                if checkbox is None:
+                    checkbox = QCheckBox(file['name'])
+                    checkbox.setObjectName(file['id'])
+                    checkbox.stateChanged.connect(self.on_checkbox_changed)
+                    self.template_checkboxes[file['id']] = checkbox
+                    self.template_layout.insertWidget(self.template_layout.count() - 1, checkbox)
+                elif checkbox.text() != file['name']:
+                    checkbox.setText(file['name'])
+                    self.selected_templates = [
+                        (file['name'], file_id) if file_id == file['id'] else (name, file_id)
+                        for name, file_id in self.selected_templates
+                    ]
+            self.update_selected_label()
+
+    def refresh_documents(self):
+        """Fetch what changed in Google Drive since the last sync, then update the list."""
+        self.handler.sync_changes()
+        self.load_documents()
 
     def show_template_preview(self, name, file_id):
         """Show preview for a single template"""
         try:
-            # Get file metadata
-            file = self.handler.service.files().get(
-                fileId=file_id, 
-                fields='name,mimeType'
-            ).execute()
-
-            # Get content based on file type
-            if file['mimeType'] == 'application/vnd.google-apps.document':
-                content = self.handler.service.files().export(
-                    fileId=file_id,
-                    mimeType='text/plain'
-                ).execute()
-                text_content = content.decode('utf-8')
-            else:
-                request = self.handler.service.files().get_media(fileId=file_id)
-                file_content = io.BytesIO()
-                downloader = MediaIoBaseDownload(file_content, request)
-                done = False
-                while not done:
-                    _, done = downloader.next_chunk()
-                text_content = file_content.getvalue().decode('utf-8')
+            # Shared with report generation, so this download is reused there
+            text_content = self.template_repository.get_content(
+                file_id, self.template_files.get(file_id))
 
             # Create and show preview dialog
             dialog = PreviewDialog(f"Preview: {name}", text_content, self)
@@ -173,10 +190,24 @@ class MiddlePanelWidget(QWidget):
         checkbox = self.sender()
         if state:  # Checked
             self.selected_templates.append((checkbox.text(), checkbox.objectName()))
+            self.prefetch_template(checkbox.objectName())
             # self.show_template_preview(checkbox.text(), checkbox.objectName())
         else:  # Unchecked
             self.selected_templates = [t for t in self.selected_templates 
                                      if t[1] != checkbox.objectName()]
+            fetch = self.template_fetches.pop(checkbox.objectName(), None)
+            if fetch is not None:
+                fetch.cancel()  # Only stops downloads that have not started yet
+        self.update_selected_label()
+
+    def prefetch_template(self, file_id):
+        """Start downloading a ticked template so report creation need not wait for it."""
+        if file_id not in self.template_fetches:
+            self.template_fetches[file_id] = self.template_repository.prefetch(
+                file_id, self.template_files.get(file_id))
+
+    def update_selected_label(self):
+        """Show the selected template names in selection order."""
         selected_names = [name for name, _ in self.selected_templates]
         self.sel_template_label.setText('<br>'.join(selected_names))
 
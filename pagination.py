@@ -0,0 +1,257 @@
+from report_templates import load_stylesheet
+import re
+import threading
+
+# CSS pixels per millimetre (96 px per inch)
+PX_PER_MM = 96 / 25.4
+
+# The page geometry is read from the stylesheet of each report type:
+# .a4-container gives the page size and padding, its .flex-rows column
+# gives .page-header and .page-footer their flex-basis and the rest to
+# .page-body, and .template-block sets the body font size.
+
+# Fonts: no font-family is set, so text is in the default serif (Times New
+# Roman or a metric-compatible face such as Liberation Serif). Titles are
+# <h3>, which the stylesheet leaves at 1.17em bold of the 16px default.
+TITLE_FONT_PX = 16 * 1.17
+# line-height: normal for Times New Roman, (ascent + descent + line gap) / em
+LINE_HEIGHT = 1.15
+# Default <p> and <h3> margins are 1em above and below; adjacent margins collapse
+PARAGRAPH_MARGIN_EM = 1
+# Space kept free at the bottom of each page, in body lines, so rounding in
+# the browser's layout never pushes the last paragraph into overflow: hidden
+BOTTOM_RESERVE_LINES = 1
+
+# Advance widths in 1/1000 em of the characters ' ' to '~' (Times Roman and
+# Times Bold, the Adobe core font metrics shared by Times New Roman)
+_PRINTABLE_ASCII = [chr(code) for code in range(32, 127)]
+TIMES_ROMAN_WIDTHS = dict(zip(_PRINTABLE_ASCII, [
+    250, 333, 408, 500, 500, 833, 778, 180, 333, 333, 500, 564, 250, 333, 250, 278,
+    500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 278, 278, 564, 564, 564, 444,
+    921, 722, 667, 667, 722, 611, 556, 722, 722, 333, 389, 722, 611, 889, 722, 722,
+    556, 722, 667, 556, 611, 722, 722, 944, 722, 722, 611, 333, 278, 333, 469, 500,
+    333, 444, 500, 444, 500, 444, 333, 500, 500, 278, 278, 500, 278, 778, 500, 500,
+    500, 500, 333, 389, 278, 500, 500, 722, 500, 500, 444, 480, 200, 480, 541,
+]))
+TIMES_ROMAN_WIDTHS.update({
+    '–': 500, '—': 1000, '‘': 333, '’': 333, '“': 444, '”': 444,
+    '•': 350, '°': 400, 'µ': 500, '×': 564, '±': 564, ' ': 250,
+})
+TIMES_BOLD_WIDTHS = dict(zip(_PRINTABLE_ASCII, [
+    250, 333, 555, 500, 500, 1000, 833, 278, 333, 333, 500, 570, 250, 333, 250, 278,
+    500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 333, 333, 570, 570, 570, 500,
+    930, 722, 667, 722, 722, 667, 611, 778, 778, 389, 500, 778, 667, 944, 722, 778,
+    611, 778, 722, 556, 667, 722, 722, 1000, 722, 722, 667, 333, 278, 333, 581, 500,
+    333, 500, 556, 444, 556, 444, 333, 500, 556, 278, 333, 556, 278, 833, 556, 500,
+    556, 556, 444, 389, 333, 556, 500, 722, 500, 500, 444, 394, 220, 394, 520,
+]))
+TIMES_BOLD_WIDTHS.update({
+    '–': 500, '—': 1000, '‘': 333, '’': 333, '“': 500, '”': 500,
+    '•': 350, '°': 400, 'µ': 556, '×': 570, '±': 570, ' ': 250,
+})
+# Width assumed for characters missing from a table
+DEFAULT_GLYPH_WIDTH = 500
+
+
+class FontMetrics:
+    """Text measurement for one font at one size, from a glyph-width table.
+
+    Word widths are cached, so measuring a long report costs little more
+    than splitting its lines into words.
+    """
+
+    def __init__(self, widths, size_px, line_height=LINE_HEIGHT):
+        self.widths = widths
+        self.size_px = size_px
+        self.line_height_px = size_px * line_height
+        self.space_width = widths[' '] * size_px / 1000
+        self._word_widths = {}
+
+    def word_width(self, word):
+        """Width of a word in CSS pixels."""
+        width = self._word_widths.get(word)
+        if width is None:
+            widths = self.widths
+            width = sum(widths.get(char, DEFAULT_GLYPH_WIDTH) for char in word) * self.size_px / 1000
+            self._word_widths[word] = width
+        return width
+
+    def line_count(self, text, max_width):
+        """Number of lines text wraps to in a box max_width pixels wide.
+
+        Wraps greedily at spaces like the browser does; a word wider than the
+        box overflows its line rather than being broken.
+        """
+        words = text.split()
+        if not words:
+            return 0
+        cached = self._word_widths.get
+        space = self.space_width
+        lines = 1
+        line_width = -space  # the first word on a line has no space before it
+        for word in words:
+            width = cached(word)
+            if width is None:
+                width = self.word_width(word)
+            if line_width + space + width <= max_width or line_width < 0:
+                line_width += space + width
+            else:
+                lines += 1
+                line_width = width
+        return lines
+
+
+def css_rules(css):
+    """Map each selector of a stylesheet to its {property: value} declarations.
+
+    Only handles the flat rules the report stylesheets use; a selector
+    repeated later adds to (and overrides) the earlier declarations.
+    """
+    rules = {}
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    for selectors, body in re.findall(r'([^{}]+)\{([^{}]*)\}', css):
+        declarations = {}
+        for declaration in body.split(';'):
+            name, _, value = declaration.partition(':')
+            if value.strip():
+                declarations[name.strip().lower()] = value.strip()
+        for selector in selectors.split(','):
+            rules.setdefault(selector.strip(), {}).update(declarations)
+    return rules
+
+
+class PageGeometry:
+    """Page size, padding and font size read from the report stylesheet.
+
+    Raises ValueError when a declaration the page breaks depend on is
+    missing or uses a unit that cannot be converted to pixels, so a
+    stylesheet change cannot silently put the estimates out of step with
+    the rendered pages.
+    """
+
+    def __init__(self, css, name='stylesheet'):
+        self.name = name
+        self.rules = css_rules(css)
+
+        self.page_width = self.length('.a4-container', 'width')
+        self.page_height = self.length('.a4-container', 'height')
+        self.page_padding = self.padding('.a4-container')
+        self.header_fraction = self.flex_basis('.page-header')
+        self.footer_fraction = self.flex_basis('.page-footer')
+        self.body_padding = self.padding('.page-body')
+        self.body_font_px = self.length('.template-block', 'font-size')
+        for selector in ('.a4-container', '.page-body'):
+            if self.value(selector, 'box-sizing') != 'border-box':
+                raise ValueError(f"{name}: {selector} must use box-sizing: border-box")
+
+    def value(self, selector, prop):
+        try:
+            return self.rules[selector][prop]
+        except KeyError:
+            raise ValueError(f"{self.name}: no {prop} for {selector}") from None
+
+    def to_px(self, selector, prop, value):
+        match = re.fullmatch(r'(-?[\d.]+)(px|mm)?', value)
+        if match is None or (match.group(2) is None and float(match.group(1)) != 0):
+            raise ValueError(f"{self.name}: {selector} {prop}: {value!r} is not in px or mm")
+        number = float(match.group(1))
+        return number * PX_PER_MM if match.group(2) == 'mm' else number
+
+    def length(self, selector, prop):
+        """A single length, in CSS pixels."""
+        return self.to_px(selector, prop, self.value(selector, prop))
+
+    def padding(self, selector):
+        """(top, right, bottom, left) padding in CSS pixels, from the padding shorthand."""
+        values = [self.to_px(selector, 'padding', value) for value in self.value(selector, 'padding').split()]
+        if not 1 <= len(values) <= 4:
+            raise ValueError(f"{self.name}: {selector} padding: expected 1 to 4 values")
+        top = values[0]
+        right = values[1] if len(values) > 1 else top
+        bottom = values[2] if len(values) > 2 else top
+        left = values[3] if len(values) > 3 else right
+        return top, right, bottom, left
+
+    def flex_basis(self, selector):
+        """The percentage flex-basis of a fixed-size flex item, as a fraction."""
+        value = self.value(selector, 'flex')
+        match = re.fullmatch(r'0\s+0\s+([\d.]+)%', value)
+        if match is None:
+            raise ValueError(f"{self.name}: {selector} flex: expected '0 0 <percentage>', got {value!r}")
+        return float(match.group(1)) / 100
+
+
+class PageLayout:
+    """Heights of report blocks against the usable height of an A4 page body.
+
+    The geometry comes from the report stylesheet at stylesheet_path, see
+    PageGeometry.
+    """
+
+    def __init__(self, stylesheet_path, body_font=None, title_font=None):
+        geometry = PageGeometry(load_stylesheet(stylesheet_path), name=stylesheet_path)
+        self.body_font = body_font or FontMetrics(TIMES_ROMAN_WIDTHS, geometry.body_font_px)
+        self.title_font = title_font or FontMetrics(TIMES_BOLD_WIDTHS, TITLE_FONT_PX)
+
+        page_top, page_right, page_bottom, page_left = geometry.page_padding
+        body_top, body_right, body_bottom, body_left = geometry.body_padding
+        content_width = geometry.page_width - page_left - page_right
+        content_height = geometry.page_height - page_top - page_bottom
+        body_height = content_height * (1 - geometry.header_fraction - geometry.footer_fraction)
+        self.text_width = content_width - body_left - body_right
+        self.page_height = (body_height - body_top - body_bottom
+                            - BOTTOM_RESERVE_LINES * self.body_font.line_height_px)
+
+        self.paragraph_gap = PARAGRAPH_MARGIN_EM * self.body_font.size_px
+        self.title_gap = PARAGRAPH_MARGIN_EM * self.title_font.size_px
+        # the "<br><br>" closing each section
+        self.section_end_height = 2 * self.body_font.line_height_px
+
+    def title_height(self, title):
+        """Height of a section title, with its margins."""
+        lines = max(self.title_font.line_count(title, self.text_width), 1)
+        return lines * self.title_font.line_height_px + 2 * self.title_gap
+
+    def paragraph_height(self, text):
+        """Height of a <p> of body text and the gap after it; empty ones take no space."""
+        lines = self.body_font.line_count(text, self.text_width)
+        if lines == 0:
+            return 0
+        return lines * self.body_font.line_height_px + self.paragraph_gap
+
+
+class Paginator:
+    """Tracks the space left on the current page while blocks are added."""
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.used = 0
+
+    def fits(self, height):
+        """True if a block of this height fits on the current page.
+
+        Anything fits on an empty page, so a block taller than a page gets
+        a page of its own instead of being moved on forever.
+        """
+        return self.used == 0 or self.used + height <= self.layout.page_height
+
+    def add(self, height):
+        self.used += height
+
+    def new_page(self):
+        self.used = 0
+
+
+_layouts = {}  # stylesheet path -> PageLayout
+_layouts_lock = threading.Lock()
+
+
+def get_page_layout(stylesheet_path):
+    """Return the process-wide PageLayout of a stylesheet, so its word-width caches are shared.
+
+    The stylesheet is read and checked (see PageGeometry) on first use.
+    """
+    with _layouts_lock:
+        if stylesheet_path not in _layouts:
+            _layouts[stylesheet_path] = PageLayout(stylesheet_path)
+        return _layouts[stylesheet_path]
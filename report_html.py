@@ -0,0 +1,113 @@
+from pagination import Paginator, get_page_layout
+
+# Stages of report generation, in order, as passed to progress callbacks
+STAGE_TEMPLATES = "Fetching templates"
+STAGE_ASSETS = "Fetching assets"
+STAGE_PAGINATING = "Paginating"
+STAGE_RENDERING = "Rendering"
+REPORT_STAGES = (STAGE_TEMPLATES, STAGE_ASSETS, STAGE_PAGINATING, STAGE_RENDERING)
+
+
+class ReportCancelled(Exception):
+    """Raised from a progress callback to abandon the report being generated."""
+
+
+def no_progress(stage):
+    """Progress callback used when the caller does not follow progress."""
+
+
+class FragmentWriter:
+    """Collects HTML fragments and joins them once at the end.
+
+    Appending to a list (or writing to an open file) keeps building a long
+    report linear in its size, where repeated string += copies the whole
+    document on every fragment. Pass out (any object with a write method,
+    e.g. an open text file) to stream the fragments there instead; then
+    getvalue() returns None.
+    """
+
+    def __init__(self, out=None):
+        self.out = out
+        self._parts = []
+        self.write = out.write if out is not None else self._parts.append
+
+    def getvalue(self):
+        """Return the collected HTML, or None when writing to a file handle."""
+        if self.out is not None:
+            return None
+        return ''.join(self._parts)
+
+
+def logo_css(company_logo):
+    """CSS setting the company logo of the page headers, once for the whole document.
+
+    The .logo-header images have no src; the stylesheets give them
+    content: var(--company-logo), which this rule defines.
+    """
+    if not company_logo:
+        return ""
+    return f':root {{ --company-logo: url("{company_logo}"); }}\n'
+
+
+def write_template_content(writer, template_dict, stylesheet_path):
+    """Write the selected template sections as A4 pages to writer.
+
+    template_dict maps the template number (starting at 1) to its text: a
+    "Title: ..." line followed by the body lines. Pages get the company
+    logo in the header (add logo_css to the stylesheet) and the copyright footer; page breaks are placed by
+    measuring each block with the pagination.PageLayout of the report's
+    stylesheet, at stylesheet_path.
+    """
+    write = writer.write
+    layout = get_page_layout(stylesheet_path)
+    paginator = Paginator(layout)
+
+    # The logo itself comes from the stylesheet (see logo_css), so pages do not repeat it
+    header_logo = ("<div class='a4-container'>\n<div class='flex-rows'>\n<div class='page-header'>\n"
+                   "<img alt='Sample Image 2' class='logo-header'>\n</div>")
+    footer = ("<div class='page-footer'>\n"
+              "<p style='color: gray; text-align: right;'>2020 Epidote Healthcare LLP </p>\n</div>")
+    # close template block and page body, footer, close flex-rows and a4-container, new page
+    page_break = "</div>\n</div>\n" + footer + "</div>\n</div>\n" + header_logo + "<div class='page-body'>\n"
+
+    # Each content is expected to be a string with the first line as title and the rest as text body
+    if len(template_dict) != 0:
+        for i, content in template_dict.items():
+            content = content.strip().splitlines()  # Clean up whitespace and newlines and split into lines
+            title,text_body = content[0].replace("Title: ", ""), content[1:]
+            title_height = layout.title_height(title)
+            if i == 1:
+                write(header_logo)
+                write("<div class='page-body'>\n")
+            else:
+                # Keep the title with the first paragraph of its section, else go to next page
+                first_paragraph = next((line for line in text_body if line.strip()), "")
+                if not paginator.fits(title_height + layout.paragraph_height(first_paragraph)):
+                    write(page_break)
+                    paginator.new_page()
+                else:
+                    # Close template block of previous template
+                    write("</div>\n")
+
+            # Add title
+            write(f"<div class='template-title'>\n<h3>{title}</h3>\n</div>\n")
+            paginator.add(title_height)
+
+            # Add line by line text body, moving a paragraph that does not fit to the next page
+            write("<div class='template-block'>\n")
+            for line in text_body:
+                height = layout.paragraph_height(line)
+                if not paginator.fits(height):
+                    write(page_break)
+                    write("<div class='template-block'>\n")
+                    paginator.new_page()
+                paginator.add(height)
+                write(f"<p>{line}</p>\n")
+            write("<br><br>")
+            paginator.add(layout.section_end_height)
+
+        #Close the last template block and page body
+        write("</div>\n</div>\n")
+        write(footer)
+        # Close flex-rows and a4-container divs
+        write("</div>\n</div>\n")
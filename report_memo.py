@@ -0,0 +1,96 @@
+from collections import OrderedDict
+from drive_cache import DriveFileCache
+from drive_sync import get_drive_sync
+import report_output
+import hashlib
+import json
+import threading
+
+# Rendered reports kept in memory; each can be several megabytes
+MAX_RENDERED_REPORTS = 4
+# report_data entries not part of the key: pending downloads, the template
+# text, which the template versions stand for, and the images that failed
+# to download (set by the generators, see is_complete)
+UNKEYED_FIELDS = ('template_fetches', 'template_content_dict', 'missing_assets')
+
+
+def folder_versions(folder_id, include=None):
+    """(file id, version) of the files of a mirrored folder, from the local mirror only.
+
+    With include, only the files for which include(file) is true.
+    None if the folder has not been mirrored in this process yet.
+    """
+    files = get_drive_sync().mirrored_files(folder_id)
+    if files is None:
+        return None
+    return sorted((file['id'], DriveFileCache.file_version(file)) for file in files
+                  if include is None or include(file))
+
+
+def report_key(report_data, source_versions):
+    """Digest of everything a rendered report depends on, except its timestamp.
+
+    source_versions are the versions of the Drive files read while
+    rendering, besides the templates (see the generators' source_versions).
+    Returns None when they are not known, and the report is not memoized.
+    """
+    if source_versions is None:
+        return None
+    normalized = {name: value for name, value in report_data.items() if name not in UNKEYED_FIELDS}
+    normalized['source_versions'] = source_versions
+    normalized['asset_mode'] = report_output.resolve_asset_mode()
+    text = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def is_complete(report_data):
+    """True unless generating the report left out images that failed to download.
+
+    Such a report is not memoized, so the next one tries them again.
+    """
+    return not report_data.get('missing_assets')
+
+
+class RenderedReportCache:
+    """The HTML of the last few reports, keyed by report_key.
+
+    Lets Export PDF reuse the report just previewed with Create Report
+    (or the other way round) instead of fetching and rendering it again.
+    """
+
+    def __init__(self, max_entries=MAX_RENDERED_REPORTS):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._reports = OrderedDict()  # key -> html
+
+    def get(self, key):
+        """Return the memoized HTML for key, or None."""
+        if key is None:
+            return None
+        with self._lock:
+            if key in self._reports:
+                self._reports.move_to_end(key)
+                return self._reports[key]
+            return None
+
+    def put(self, key, html_content):
+        if key is None:
+            return
+        with self._lock:
+            self._reports[key] = html_content
+            self._reports.move_to_end(key)
+            while len(self._reports) > self.max_entries:
+                self._reports.popitem(last=False)
+
+
+_reports = None
+_reports_lock = threading.Lock()
+
+
+def get_rendered_report_cache():
+    """Return the process-wide RenderedReportCache, creating it on first use."""
+    global _reports
+    with _reports_lock:
+        if _reports is None:
+            _reports = RenderedReportCache()
+        return _reports
@@ -0,0 +1,123 @@
+from datetime import datetime
+from asset_cache import get_asset_cache
+from drive_cache import cache_root, get_drive_cache, DriveFileCache
+import hashlib
+import mimetypes
+import os
+import tempfile
+
+ASSET_MODE_ENV_VAR = 'REPORT_GUI_ASSET_MODE'
+# Images inlined as base64 data URLs, the report is a single self-contained string
+INLINE = 'inline'
+# Images written to an assets directory next to the report and linked by relative URL
+EXTERNAL = 'external'
+ASSET_MODES = (INLINE, EXTERNAL)
+ASSETS_DIR_NAME = 'assets'
+# Written reports and exported images kept on disk, the oldest are deleted first
+MAX_SAVED_REPORTS = 10
+MAX_ASSETS_BYTES = 256 * 1024 * 1024
+
+# Set from the command line (see main.py), takes precedence over the environment
+_asset_mode_override = None
+
+
+def set_asset_mode(mode):
+    """Override the asset mode of every report generated afterwards."""
+    global _asset_mode_override
+    _asset_mode_override = mode
+
+
+def resolve_asset_mode():
+    """Return the asset mode: CLI override, then environment, then inline."""
+    mode = (_asset_mode_override or os.environ.get(ASSET_MODE_ENV_VAR) or INLINE).lower()
+    if mode not in ASSET_MODES:
+        print(f"Unknown asset mode {mode!r}, using {INLINE}")
+        return INLINE
+    return mode
+
+
+def reports_dir():
+    """Directory the reports and their shared assets directory are written to."""
+    return os.path.join(cache_root(), 'reports')
+
+
+def _asset_file_name(file):
+    """Name of an exported image: digests of its file id and version, plus the extension."""
+    version = DriveFileCache.file_version(file) or ''
+    digest = hashlib.sha256(f"{file['id']}\0{version}".encode()).hexdigest()[:32]
+    return digest + (mimetypes.guess_extension(file['mimeType']) or '')
+
+
+def export_asset(service, file, output_dir=None):
+    """Write an image to the assets directory, once per version, and return its relative URL."""
+    assets_dir = os.path.join(output_dir or reports_dir(), ASSETS_DIR_NAME)
+    name = _asset_file_name(file)
+    path = os.path.join(assets_dir, name)
+    if DriveFileCache.file_version(file) and os.path.exists(path):
+        # Mark it as recently used, see prune_outputs
+        os.utime(path)
+    else:
+        os.makedirs(assets_dir, exist_ok=True)
+        cache = get_drive_cache()
+        # Copied from the on-disk cache by path, so the bytes are not kept in memory
+        if not cache.copy_to(file, path):
+            data = cache.fetch(service, file)
+            # Files without a version (or too large) are not cached, write them directly
+            if not cache.copy_to(file, path):
+                fd, tmp_path = tempfile.mkstemp(dir=assets_dir, prefix='.')
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+    return f"{ASSETS_DIR_NAME}/{name}"
+
+
+def asset_url(service, file):
+    """URL of an image for a report, according to the asset mode."""
+    if resolve_asset_mode() == EXTERNAL:
+        return export_asset(service, file)
+    return get_asset_cache().data_url(service, file)
+
+
+def write_report(html_content, output_dir=None):
+    """Write the HTML of a report next to the assets directory and return its path."""
+    output_dir = output_dir or reports_dir()
+    os.makedirs(output_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=output_dir, suffix='.html',
+                                prefix=f"Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}_")
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(html_content)
+    prune_outputs(output_dir)
+    return path
+
+
+def _oldest_first(directory, matches):
+    """(mtime, path, size) of the files in directory whose name matches, oldest first."""
+    try:
+        entries = [entry for entry in os.scandir(directory) if entry.is_file() and matches(entry.name)]
+    except FileNotFoundError:
+        return []
+    found = []
+    for entry in entries:
+        stat = entry.stat()
+        found.append((stat.st_mtime, entry.path, stat.st_size))
+    return sorted(found)
+
+
+def prune_outputs(output_dir=None):
+    """Delete the oldest written reports beyond MAX_SAVED_REPORTS, and the least
+    recently used exported images beyond MAX_ASSETS_BYTES."""
+    output_dir = output_dir or reports_dir()
+    reports = _oldest_first(output_dir, lambda name: name.startswith('Report_') and name.endswith('.html'))
+    assets = _oldest_first(os.path.join(output_dir, ASSETS_DIR_NAME), lambda name: not name.startswith('.'))
+    total_bytes = sum(size for _, _, size in assets)
+    doomed = [path for _, path, _ in reports[:max(len(reports) - MAX_SAVED_REPORTS, 0)]]
+    for _, path, size in assets:
+        if total_bytes <= MAX_ASSETS_BYTES:
+            break
+        doomed.append(path)
+        total_bytes -= size
+    for path in doomed:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
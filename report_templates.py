@@ -0,0 +1,75 @@
+from string import Formatter
+import hashlib
+import threading
+
+_lock = threading.Lock()
+_templates = {}  # path -> CompiledTemplate
+_stylesheets = {}  # path -> css text
+_stylesheets_by_digest = {}  # sha256 of css -> css text, shared by identical files
+
+
+class CompiledTemplate:
+    """An HTML report template parsed once into literal text and {field} slots.
+
+    Uses the str.format syntax of the template files. The placeholders are
+    checked against the declared fields when the template is compiled, and
+    render() fills them in a single pass without re-parsing the document.
+    """
+
+    def __init__(self, source, fields, name='template'):
+        self.name = name
+        self.segments = []  # (literal text, field name or None, format spec, conversion)
+        used = set()
+        for literal, field, format_spec, conversion in Formatter().parse(source):
+            if field is not None:
+                if not field.isidentifier():
+                    raise ValueError(f"{name}: unsupported placeholder {{{field}}}, use plain {{name}} fields")
+                used.add(field)
+            self.segments.append((literal, field, format_spec, conversion))
+
+        undeclared = used - set(fields)
+        if undeclared:
+            raise ValueError(f"{name}: placeholders not declared by the generator: "
+                             + ', '.join(sorted(undeclared)))
+        self.fields = frozenset(used)
+
+    def render(self, **values):
+        """Return the document with every placeholder replaced."""
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"{self.name}: no value for " + ', '.join(sorted(missing)))
+
+        parts = []
+        for literal, field, format_spec, conversion in self.segments:
+            parts.append(literal)
+            if field is None:
+                continue
+            value = values[field]
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 'a':
+                value = ascii(value)
+            elif conversion == 's':
+                value = str(value)
+            parts.append(format(value, format_spec))
+        return ''.join(parts)
+
+
+def load_template(path, fields):
+    """Return the compiled template at path, reading and compiling it only once."""
+    with _lock:
+        if path not in _templates:
+            with open(path, 'r', encoding='utf-8') as f:
+                _templates[path] = CompiledTemplate(f.read(), fields, name=path)
+        return _templates[path]
+
+
+def load_stylesheet(path):
+    """Return the css at path, read once; identical files share one string."""
+    with _lock:
+        if path not in _stylesheets:
+            with open(path, 'r', encoding='utf-8') as f:
+                css = f.read()
+            digest = hashlib.sha256(css.encode('utf-8')).hexdigest()
+            _stylesheets[path] = _stylesheets_by_digest.setdefault(digest, css)
+        return _stylesheets[path]
@@ -1,9 +1,9 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QTextEdit, 
                             QLabel, QScrollArea, QGroupBox,
                             QPushButton, QHBoxLayout, QMessageBox,
-                            QFileDialog)
+                            QFileDialog, QProgressDialog)
 from PyQt5.QtPrintSupport import QPrinter  # Add for PDF export
-from PyQt5.QtCore import Qt, QMarginsF
+from PyQt5.QtCore import Qt, QMarginsF, QObject, QThread, pyqtSignal
 from PyQt5.QtGui import QTextDocument
 from config_handler import ConfigHandler
 from Get_data_right_panel import RightPanelHandler
@@ -11,6 +11,11 @@ from dnagenome_integrity_html_generator import DNAGI_HTMLGenerator
 from adventitious_html_generator import AD_HTMLGenerator
 from validation_html_generator import VAL_HTMLGenerator
 import serve_html_content as serve_html
+import report_output
+from report_memo import get_rendered_report_cache, report_key, is_complete
+from report_html import REPORT_STAGES, STAGE_TEMPLATES, ReportCancelled
+import os
+import threading
 from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
 import io
 from datetime import datetime
@@ -39,19 +44,105 @@ class HTMLToDocxParser(HTMLParser):
         return self.text.getvalue()
 
 
+class ReportWorker(QObject):
+    """Generates the HTML of a report off the GUI thread.
+
+    report_data comes from RightPanelHandler.collect_report_data, read on
+    the GUI thread; the worker syncs the Drive mirror, downloads again the
+    templates edited since they were ticked (middle_panel holds their
+    listing and downloads), returns the memoized
+    report if the same one was rendered before (e.g. previewed, now
+    exported), else waits for the templates and runs the generator,
+    reporting each stage through progress.
+    """
+    progress = pyqtSignal(int, str)  # index in REPORT_STAGES, stage name
+    finished = pyqtSignal(str)  # the HTML
+    invalid = pyqtSignal(list)  # warnings about the report data
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, handler, html_generator, report_data, middle_panel):
+        super().__init__()
+        self.handler = handler
+        self.middle_panel = middle_panel
+        self.html_generator = html_generator
+        self.report_data = report_data
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """Ask the worker to stop at the next stage; safe to call from any thread."""
+        self._cancel.set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise ReportCancelled()
+
+    def memo_key(self):
+        """Key of the report in the memo, or None if it cannot be memoized yet."""
+        try:
+            return report_key(self.report_data, self.html_generator.source_versions(self.report_data))
+        except Exception as e:
+            print(f"Error computing report key: {str(e)}")
+            return None
+
+    def on_stage(self, stage):
+        self.check_cancelled()
+        self.progress.emit(REPORT_STAGES.index(stage), stage)
+
+    def run(self):
+        try:
+            self.on_stage(STAGE_TEMPLATES)
+            # Keyed after the sync, so the key has the current versions of the Drive files
+            self.handler.sync_drive()
+            self.handler.update_template_fetches(self.report_data, self.middle_panel)
+            html_content = get_rendered_report_cache().get(self.memo_key())
+            if html_content is not None:
+                self.finished.emit(html_content)
+                return
+
+            warnings = self.handler.fetch_templates(self.report_data, self.check_cancelled)
+            if warnings:
+                self.invalid.emit(warnings)
+                return
+            html_content = self.html_generator.generate_html(self.report_data, progress=self.on_stage)
+            self.check_cancelled()
+            if html_content:
+                if is_complete(self.report_data):
+                    # Keyed again: folders first read while rendering are mirrored only now
+                    get_rendered_report_cache().put(self.memo_key(), html_content)
+                self.finished.emit(html_content)
+            else:
+                self.failed.emit("Failed to generate HTML content")
+        except ReportCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(f"Error creating report: {str(e)}")
+
+
 class RightPanelWidget(QWidget):
+    # HTML generator class for each entry of the "Report Type" combo
+    REPORT_GENERATORS = {
+        "DNA Genome Integrity": DNAGI_HTMLGenerator,
+        "Adventitious Agent Detection": AD_HTMLGenerator,
+        "PhiX Validation": VAL_HTMLGenerator,
+    }
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.init_ui()
         self.setObjectName("right_panel") 
-        # Initialize HTML generators
-        self.dnagi_html_generator = DNAGI_HTMLGenerator()  # Default to DNA Genome Integrity
-        self.ad_html_generator = AD_HTMLGenerator()
-        self.val_html_generator = VAL_HTMLGenerator()
+        # HTML generators are created on first use, see get_html_generator,
+        # but their templates are compiled (and checked) now
+        self.html_generators = {}
+        for generator_class in self.REPORT_GENERATORS.values():
+            generator_class.load_resources()
 
         self.handler = RightPanelHandler()
         # Initialize handler after UI
         self.config_handler = ConfigHandler()
+        # The running report job, see start_report_job
+        self.report_thread = None
+        self.report_worker = None
         
     def init_ui(self):
         # Create main layout once
@@ -70,9 +161,9 @@ class RightPanelWidget(QWidget):
         header_layout.addStretch()
         
         # Add Create Report button to header
-        create_report_btn = QPushButton("Create Report")
-        create_report_btn.clicked.connect(self.create_report)
-        create_report_btn.setStyleSheet("""
+        self.create_report_btn = QPushButton("Create Report")
+        self.create_report_btn.clicked.connect(self.create_report)
+        self.create_report_btn.setStyleSheet("""
             QPushButton {
                 background-color: #4CAF50;
                 color: white;
@@ -84,7 +175,7 @@ class RightPanelWidget(QWidget):
                 background-color: #45a049;
             }
         """)
-        header_layout.addWidget(create_report_btn)
+        header_layout.addWidget(self.create_report_btn)
 
         # Create Export PDF button
         self.export_btn = QPushButton("Export PDF")
@@ -208,13 +299,21 @@ class RightPanelWidget(QWidget):
         widget.setParent(None)
 
 
+    def get_html_generator(self, report_type):
+        """Return the HTML generator for a report type, creating it on first request."""
+        if report_type not in self.REPORT_GENERATORS:
+            return None
+        if report_type not in self.html_generators:
+            self.html_generators[report_type] = self.REPORT_GENERATORS[report_type]()
+        return self.html_generators[report_type]
+
     def export_to_pdf(self):
-        """Export the latest HTML content to PDF using QWebEnginePage."""
-        try:
-            html_content = self.get_data_and_html_content()
-            if not html_content:
-                return
+        """Generate the report in the background, then export it to PDF."""
+        self.start_report_job(self.save_pdf)
 
+    def save_pdf(self, html_content):
+        """Export HTML content to PDF using QWebEnginePage."""
+        try:
             file_name, _ = QFileDialog.getSaveFileName(
                 self,
                 "Export PDF",
@@ -245,8 +344,19 @@ class RightPanelWidget(QWidget):
                     loop.quit()
 
             page.loadFinished.connect(on_load_finished)
-            page.setHtml(html_content, QUrl("file:///"))  # base URL for relative paths
-            loop.exec_()
+            report_path = None
+            try:
+                if report_output.resolve_asset_mode() == report_output.EXTERNAL:
+                    # Load from disk, so the relative image URLs resolve to the assets directory
+                    report_path = report_output.write_report(html_content)
+                    page.load(QUrl.fromLocalFile(report_path))
+                else:
+                    page.setHtml(html_content, QUrl("file:///"))  # base URL for relative paths
+                loop.exec_()
+            finally:
+                # Only needed while printing
+                if report_path:
+                    os.remove(report_path)
 
         except Exception as e:
             QMessageBox.critical(
@@ -256,8 +366,12 @@ class RightPanelWidget(QWidget):
             )
 
 
-    def get_data_and_html_content(self):
-        """Collect report data from both panels and validate."""
+    def collect_report_inputs(self):
+        """Collect report data from the panels and validate it, on the GUI thread.
+
+        Returns (report_data, html_generator), or None after showing why
+        the report cannot be made.
+        """
         try:
             # Get the main window and find left panel
             main_window = self.window()  # Get the top-level window
@@ -269,41 +383,112 @@ class RightPanelWidget(QWidget):
                         
             # If there are warnings, show them and return None
             if warnings:
-                QMessageBox.warning(
-                    self,
-                    "Validation Error",
-                    "Please fix the following issues:\n• " + "\n• ".join(warnings)
-                )
-                return None          
-        
-            # Generate HTML content 
-            if report_data['report_type'] == "DNA Genome Integrity":
-                html_content = self.dnagi_html_generator.generate_html(report_data)
-            elif report_data['report_type'] == "Adventitious Agent Detection":
-                html_content = self.ad_html_generator.generate_html(report_data)
-            elif report_data['report_type'] == "PhiX Validation":        
-                html_content = self.val_html_generator.generate_html(report_data)
-            else:
+                self.show_report_warnings(warnings)
+                return None
+
+            html_generator = self.get_html_generator(report_data['report_type'])
+            if html_generator is None:
                 QMessageBox.warning(
                     self,
                     "Error",
                     "Please select a valid report type"
                 )
                 return None
-
-            return html_content
+            return report_data, html_generator
 
         except Exception as e:
             QMessageBox.critical(
                 self,
                 "Error",
                 f"Error creating report: {str(e)}"
-            )        
+            )
+            return None
+
+    def show_report_warnings(self, warnings):
+        QMessageBox.warning(
+            self,
+            "Validation Error",
+            "Please fix the following issues:\n• " + "\n• ".join(warnings)
+        )
+
+    def start_report_job(self, on_html_ready):
+        """Generate the report on a background thread and pass its HTML to on_html_ready.
+
+        Progress is shown in a dialog whose Cancel button stops the job.
+        Create Report and Export PDF are disabled while it runs.
+        """
+        inputs = self.collect_report_inputs()
+        if inputs is None:
+            return
+        report_data, html_generator = inputs
+
+        self.report_buttons_enabled(False)
+        self.report_progress = QProgressDialog("Generating report...", "Cancel", 0, len(REPORT_STAGES), self)
+        self.report_progress.setWindowTitle("Create Report")
+        self.report_progress.setWindowModality(Qt.WindowModal)
+        self.report_progress.setMinimumDuration(0)
+        self.report_progress.setAutoClose(False)
+        self.report_progress.setAutoReset(False)
+        self.report_progress.setValue(0)
+
+        self.report_thread = QThread(self)
+        middle_panel = self.window().findChild(QWidget, "middle_panel")
+        self.report_worker = ReportWorker(self.handler, html_generator, report_data, middle_panel)
+        self.report_worker.moveToThread(self.report_thread)
+        self.report_thread.started.connect(self.report_worker.run)
+        # The worker's thread is busy in run(), so cancel() is called directly
+        self.report_progress.canceled.connect(self.report_worker.cancel, Qt.DirectConnection)
+        self.report_worker.progress.connect(self.on_report_progress)
+        # Close the progress dialog before handing over the result
+        for signal in (self.report_worker.finished, self.report_worker.invalid,
+                       self.report_worker.failed, self.report_worker.cancelled):
+            signal.connect(self.on_report_job_done)
+            signal.connect(self.report_thread.quit)
+        self.report_worker.finished.connect(on_html_ready)
+        self.report_worker.invalid.connect(self.show_report_warnings)
+        self.report_worker.failed.connect(self.on_report_failed)
+        self.report_thread.finished.connect(self.on_report_thread_finished)
+        self.report_thread.finished.connect(self.report_worker.deleteLater)
+        self.report_thread.finished.connect(self.report_thread.deleteLater)
+        self.report_thread.start()
+
+    def on_report_thread_finished(self):
+        # Both are deleted next, see start_report_job
+        self.report_thread = None
+        self.report_worker = None
+
+    def stop_report_job(self):
+        """Cancel the report job, if one is running, and wait for its thread to finish.
+
+        Called when the window closes: destroying a running QThread aborts
+        the process. A download in progress is finished first.
+        """
+        if self.report_thread is not None and self.report_thread.isRunning():
+            self.report_worker.cancel()
+            self.report_thread.quit()
+            self.report_thread.wait()
+
+    def report_buttons_enabled(self, enabled):
+        self.create_report_btn.setEnabled(enabled)
+        self.export_btn.setEnabled(enabled)
+
+    def on_report_progress(self, index, stage):
+        self.report_progress.setLabelText(f"{stage}...")
+        self.report_progress.setValue(index)
+
+    def on_report_failed(self, message):
+        QMessageBox.critical(self, "Error", message)
+
+    def on_report_job_done(self, *args):
+        """Close the progress dialog once the worker has finished, whatever the outcome."""
+        self.report_progress.close()
+        self.report_buttons_enabled(True)
 
     def create_report(self):
-        # Get HTML content and report data
-        html_content = self.get_data_and_html_content()
+        """Generate the report in the background, then open it in the browser."""
+        self.start_report_job(self.show_report)
 
+    def show_report(self, html_content):
         if html_content:
             # timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             # # Prepare in-memory file for upload
@@ -335,8 +520,19 @@ class RightPanelWidget(QWidget):
             #     f"Report uploaded to Google Drive!"
             # )
 
-            # Serve HTML safely
-            serve_html.serve_html_safely(html_content)
+            # Publish on the local report server, which returns right away
+            # and keeps the report available for reloading
+            assets_dir = None
+            if report_output.resolve_asset_mode() == report_output.EXTERNAL:
+                # The server reads the report's images from the shared assets directory
+                report_output.prune_outputs()
+                assets_dir = os.path.join(report_output.reports_dir(), report_output.ASSETS_DIR_NAME)
+            if serve_html.serve_html_safely(html_content, assets_dir=assets_dir) is None:
+                QMessageBox.critical(
+                    self,
+                    "Error",
+                    "Failed to start the report preview server"
+                )
 
         else:
             QMessageBox.critical(
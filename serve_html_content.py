@@ -1,54 +1,155 @@
-
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import threading
-import http.server
-import socketserver
 import webbrowser
-import time
-import io
-
-def serve_html_safely(html_content, port=8000, serve_time=5):
-    """Safely serve HTML content with proper error handling"""
-    
-    # Find available port if specified port is busy
-    import socket
-    for test_port in range(port, port + 10):
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.bind(('localhost', test_port))
-                port = test_port
-                break
-        except OSError:
-            continue
-    else:
-        raise RuntimeError("Could not find available port")
-    
-    class SafeHTMLHandler(http.server.BaseHTTPRequestHandler):
-        def do_GET(self):
+import hashlib
+import os
+import mimetypes
+from urllib.parse import unquote, urlsplit
+
+# Ports tried first, so the preview URL usually stays the same between runs
+DEFAULT_PORT = 8000
+PORT_ATTEMPTS = 10
+# Reports kept for reloading, the least recently published are dropped first
+MAX_REPORTS = 32
+MAX_REPORT_BYTES = 256 * 1024 * 1024
+
+
+class ReportServer:
+    """Long-lived localhost server for report previews.
+
+    Started on first use on a daemon thread, it serves each published
+    report at /reports/<id>/ (and its external assets below that) until
+    the report is evicted, so the browser can reload it at any time. The
+    report id is a digest of its HTML and doubles as its ETag.
+    """
+
+    def __init__(self, port=DEFAULT_PORT, max_reports=MAX_REPORTS, max_bytes=MAX_REPORT_BYTES):
+        self.port = port
+        self.max_reports = max_reports
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._reports = OrderedDict()  # report id -> (html bytes, assets dir or None)
+        self._total_bytes = 0
+        self._httpd = None
+
+    def _start(self):
+        """Bind the first free port (an OS-assigned one as last resort) and serve on a thread."""
+        handler = self._handler_class()
+        for port in list(range(self.port, self.port + PORT_ATTEMPTS)) + [0]:
             try:
+                httpd = ThreadingHTTPServer(('localhost', port), handler)
+                break
+            except OSError:
+                continue
+        else:
+            raise RuntimeError("Could not find available port")
+        httpd.daemon_threads = True
+        threading.Thread(target=httpd.serve_forever, name='report-server', daemon=True).start()
+        self._httpd = httpd
+        print(f"Report server running at: http://localhost:{httpd.server_address[1]}")
+
+    def publish(self, html_content, assets_dir=None):
+        """Host a report and return its URL; starts the server on first use."""
+        data = html_content.encode('utf-8')
+        report_id = hashlib.sha256(data).hexdigest()[:32]
+        with self._lock:
+            if self._httpd is None:
+                self._start()
+            if report_id in self._reports:
+                self._total_bytes -= len(self._reports.pop(report_id)[0])
+            self._reports[report_id] = (data, assets_dir)
+            self._total_bytes += len(data)
+            while len(self._reports) > 1 and (len(self._reports) > self.max_reports
+                                              or self._total_bytes > self.max_bytes):
+                _, (evicted, _) = self._reports.popitem(last=False)
+                self._total_bytes -= len(evicted)
+            port = self._httpd.server_address[1]
+        return f"http://localhost:{port}/reports/{report_id}/"
+
+    def _lookup(self, report_id):
+        with self._lock:
+            return self._reports.get(report_id)
+
+    def _handler_class(self):
+        server = self
+
+        class ReportHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                try:
+                    parts = unquote(urlsplit(self.path).path).split('/')
+                    # ['', 'reports', id, ''] or ['', 'reports', id, 'assets', name]
+                    report = server._lookup(parts[2]) if len(parts) > 3 and parts[1] == 'reports' else None
+                    if report is None:
+                        self.send_error(404, "Report not found (it may have been replaced by newer ones)")
+                    elif len(parts) == 4 and parts[3] == '':
+                        self.send_cached(report[0], 'text/html; charset=utf-8', parts[2], 'no-cache')
+                    elif len(parts) == 5 and parts[3] == 'assets' and report[1]:
+                        self.send_asset(report[1], os.path.basename(parts[4]))
+                    else:
+                        self.send_error(404, "Not Found")
+                except Exception as e:
+                    self.send_error(500, f"Server Error: {str(e)}")
+
+            def send_cached(self, data, content_type, etag, cache_control):
+                """Send data, or 304 Not Modified if the browser already has this ETag."""
+                etag = f'"{etag}"'
+                if etag in self.headers.get('If-None-Match', ''):
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
                 self.send_response(200)
-                self.send_header('Content-type', 'text/html; charset=utf-8')
-                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Content-type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', cache_control)
                 self.end_headers()
-                self.wfile.write(html_content.encode('utf-8'))
-            except Exception as e:
-                self.send_error(500, f"Server Error: {str(e)}")
-        
-        def log_message(self, format, *args):
-            pass
-    
+                self.wfile.write(data)
+
+            def send_asset(self, assets_dir, name):
+                path = os.path.join(assets_dir, name)
+                if not name or not os.path.isfile(path):
+                    self.send_error(404, "Not Found")
+                    return
+                with open(path, 'rb') as f:
+                    data = f.read()
+                # Asset names are derived from the file version, so they never change
+                self.send_cached(data, mimetypes.guess_type(name)[0] or 'application/octet-stream',
+                                 os.path.splitext(name)[0], 'max-age=31536000, immutable')
+
+            def log_message(self, format, *args):
+                pass
+
+        return ReportHandler
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_report_server(port=DEFAULT_PORT):
+    """Return the process-wide ReportServer, creating it on first use (port only applies then)."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ReportServer(port)
+        return _server
+
+
+def serve_html_safely(html_content, port=DEFAULT_PORT, assets_dir=None):
+    """Publish HTML content on the report server and open it in the browser.
+
+    Returns immediately and the report stays available for reloading.
+    With assets_dir, the report's relative assets/... image URLs are served
+    from that directory (see report_output, external asset mode). port is
+    only used when the server is first started.
+    """
     try:
-        with socketserver.TCPServer(("localhost", port), SafeHTMLHandler) as httpd:
-            server_thread = threading.Thread(target=httpd.serve_forever)
-            server_thread.daemon = True
-            server_thread.start()
-            
-            url = f'http://localhost:{port}'
-            webbrowser.open(url)
-            print(f"HTML served at: {url}")
-            
-            time.sleep(serve_time)
-            httpd.shutdown()
-            print("Server stopped")
-            
+        url = get_report_server(port).publish(html_content, assets_dir)
+        webbrowser.open(url)
+        print(f"HTML served at: {url}")
+        return url
     except Exception as e:
-        print(f"Server error: {str(e)}")
\ No newline at end of file
+        print(f"Server error: {str(e)}")
+        return None
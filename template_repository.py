@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from drive_session import get_drive_session
+from drive_cache import get_drive_cache, VERSION_FIELDS
+import threading
+
+# Background template downloads
+MAX_TEMPLATE_WORKERS = 4
+# Decoded templates kept in memory
+MAX_CACHED_TEMPLATES = 128
+
+
+class TemplateRepository:
+    """Template text shared by the preview dialog and report generation.
+
+    Decoded text is kept in an in-memory LRU keyed by file id plus
+    modifiedTime, so previewing a template and then building a report (or
+    building several reports) downloads it at most once. Below that the
+    on-disk DriveFileCache avoids downloads across restarts.
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_TEMPLATES):
+        self.session = get_drive_session()
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._texts = OrderedDict()  # (file_id, modifiedTime) -> text
+        self._pool = ThreadPoolExecutor(max_workers=MAX_TEMPLATE_WORKERS,
+                                        thread_name_prefix='template-fetch')
+
+    def get_content(self, file_id, file_metadata=None):
+        """Return the text of a template, downloading it only if this version is not cached.
+
+        file_metadata is the entry from the template listing; without it an
+        extra metadata request is made. Errors are raised.
+        """
+        drive_service = self.session.drive()
+        if file_metadata is None:
+            file_metadata = drive_service.files().get(
+                fileId=file_id,
+                fields=f'id,name,mimeType,parents,{VERSION_FIELDS}'
+            ).execute()
+
+        key = (file_id, file_metadata.get('modifiedTime'))
+        with self._lock:
+            if key in self._texts:
+                self._texts.move_to_end(key)
+                return self._texts[key]
+
+        # Get content based on file type
+        if file_metadata['mimeType'] == 'application/vnd.google-apps.document':
+            export_mime_type = 'text/plain'  # Use 'text/html' for formatting, or 'text/plain' for plain text
+        else:
+            export_mime_type = None
+        content = get_drive_cache().fetch(drive_service, file_metadata, export_mime_type)
+        text_content = content.decode('utf-8')
+
+        with self._lock:
+            self._texts[key] = text_content
+            self._texts.move_to_end(key)
+            while len(self._texts) > self.max_entries:
+                self._texts.popitem(last=False)
+        return text_content
+
+    def prefetch(self, file_id, file_metadata=None):
+        """Start get_content on the bounded background pool and return its Future."""
+        return self._pool.submit(self.get_content, file_id, file_metadata)
+
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def get_template_repository():
+    """Return the process-wide TemplateRepository, creating it on first use."""
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            _repository = TemplateRepository()
+        return _repository
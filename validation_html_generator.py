@@ -1,16 +1,64 @@
 from datetime import datetime
 import os
 import math
-import base64
 import json
-from io import BytesIO
-from googleapiclient.http import MediaIoBaseDownload
+from concurrent.futures import ThreadPoolExecutor
 from Get_data_middle_panel import TemplateHandler
+from report_templates import load_template, load_stylesheet
+from report_html import logo_css, no_progress, ReportCancelled, STAGE_ASSETS, STAGE_RENDERING
+from drive_sync import get_drive_sync
+from validation_index import get_validation_index, project_code, VAL_DATA_IMAGES, VAL_DATA_JSON
+from asset_cache import get_asset_cache
+from report_output import asset_url
+from report_memo import folder_versions
+
+# Downloads of the validation files, kept for the whole session: Drive clients
+# are per thread, so long-lived threads reuse theirs from report to report
+_validation_download_pool = ThreadPoolExecutor(max_workers=len(VAL_DATA_IMAGES) + 1,
+                                               thread_name_prefix='validation-fetch')
+
+def calculate_statistics(val_json):
+    """Calculate the sequencing statistics of the report from validation_data.json."""
+    #Number of bases sequenced in Mb = number of reads (in fastqc file) x 2 (if paired end) x read length (in fastqc file) bases ---- convert to Mb
+    bases_sequenced_bp = val_json['Number_of_reads'] * val_json['Paired_end']
+    bases_sequenced_in_Mb = ((val_json['Number_of_reads'] * val_json['Paired_end'] * val_json['Read_length']) / 1e6)
+    total_number_of_bases = val_json['Read_length'] * val_json['Number_of_reads'] * val_json['Paired_end']
+    expected_coverage = total_number_of_bases / (val_json['Genome_size_Kb'] * 1e3)
+    #X coverage of sequenced data =( Number of bases sequenced in Mb (above calc) * 1000000  (if converted to Mb)) / Genome size in bp (in json file)
+    coverage = (bases_sequenced_in_Mb * 1e6) / (val_json['Genome_size_Kb'] * 1e3)
+    return {
+        'bases_sequenced_bp': bases_sequenced_bp,
+        'bases_sequenced_in_Mb': bases_sequenced_in_Mb,
+        'total_number_of_bases': total_number_of_bases,
+        'expected_coverage': expected_coverage,
+        'coverage': coverage,
+    }
 
 class VAL_HTMLGenerator:
+    # Placeholders this generator fills in, checked against the template at load
+    TEMPLATE_FIELDS = {
+        'css', 'dna_img', 'company_logo', 'run', 'flow_cell', 'run_date', 'tech',
+        'genome_size', 'genome_size_in_bp', 'bases_sequenced_in_Mb', 'coverage',
+        'alignment_stats', 'read_length', 'bases_sequenced_bp', 'total_number_of_bases',
+        'expected_coverage', 'adapter_content_img', 'average_base_calling_accuracy_img',
+        'basecoverage_img', 'per_base_quality_img', 'val_json', 'title', 'project',
+        'analysis_type', 'reference', 'samples', 'conclusion', 'poi_prj_coord',
+        'poi_ngs_tech', 'email_prj_coord', 'email_ngs_tech', 'poi_client_appr',
+        'poi_client_rep', 'timestamp'
+    }
+
+    TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), 'templates/validation_report_template.html')
+    STYLESHEET_PATH = os.path.join(os.path.dirname(__file__), 'static/val_style.css')
+
+    @classmethod
+    def load_resources(cls):
+        """Return the compiled template and the stylesheet, read from disk only once per process."""
+        return load_template(cls.TEMPLATE_PATH, cls.TEMPLATE_FIELDS), load_stylesheet(cls.STYLESHEET_PATH)
+
     def __init__(self):
-        self.template_path = os.path.join(os.path.dirname(__file__), 'templates/validation_report_template.html')
-        self.stylesheet = os.path.join(os.path.dirname(__file__), 'static/val_style.css')
+        self.template_path = self.TEMPLATE_PATH
+        self.stylesheet = self.STYLESHEET_PATH
+        self.template, self.css = self.load_resources()
         self.handler = TemplateHandler()
         if not self.handler.authenticate():
             raise Exception("Authentication failed")
@@ -21,15 +69,11 @@ class VAL_HTMLGenerator:
             logo_folder = self.handler.config.get_logo_folder_id()
             logos = {}
             
-            # Query for both logos
-            query = f"parents='{logo_folder}' and mimeType contains 'image/' and trashed=false"
-            results = self.handler.service.files().list(
-                q=query,
-                fields="files(id, name, mimeType)",
-                pageSize=10
-            ).execute()
-            
-            files = results.get('files', [])
+            # Images in the logo folder, from the local mirror of its listing
+            files = [
+                file for file in get_drive_sync().folder_files(self.handler.service, logo_folder)
+                if file['mimeType'].startswith('image/')
+            ]
             if not files:
                 print("No logos found in logo folder")
                 return None
@@ -37,9 +81,9 @@ class VAL_HTMLGenerator:
             # print("IMAGE FILES", files)
             # Find specific logos by name
             for file in files:
-                if 'dna' in file['name'].lower():
+                if 'dna' in file['name'].lower() and 'dna' not in logos:
                     logos['dna'] = self._download_file(file,"image")
-                elif 'company' in file['name'].lower():
+                elif 'company' in file['name'].lower() and 'company' not in logos:
                     logos['company'] = self._download_file(file,"image")
             
             return logos
@@ -51,86 +95,91 @@ class VAL_HTMLGenerator:
     def get_val_data_images_and_json(self, project_name):
         try:
             valdata_folder = self.handler.config.get_validation_data_folder_id()
-            data_images = {}
-            json_data = {}
             
-            # Query for both logos
-            query = (
-                f"'{valdata_folder}' in parents and "
-                "(mimeType contains 'image/' or mimeType = 'application/json') and trashed=false"
-            )
-            results = self.handler.service.files().list(
-                q=query,
-                fields="files(id, name, mimeType)",
-                pageSize=10
-            ).execute()
+            # Files of this project only, from the validation-data index
+            files = [
+                file for file in get_validation_index(valdata_folder).project_files(self.handler.service, project_name)
+                if file['mimeType'].startswith('image/') or file['mimeType'] == 'application/json'
+            ]
             
-            files = results.get('files', [])
+            # print("IMAGE FILES", files)
+            # Find specific files by name
+            image_files = {}
+            json_file = None
+            for file in files:
+                name = file['name'].lower()
+                image = next((image for image in VAL_DATA_IMAGES if image in name), None)
+                if image is not None:
+                    image_files[image] = file
+                elif name.endswith(VAL_DATA_JSON):
+                    json_file = file
+
             # print("FILES", files)
             if not files:
-                print("No logos found in logo folder")
+                print(f"No validation data found for project {project_name}")
                 return None
-            
-            # print("IMAGE FILES", files)
-            # Find specific logos by name
-            for file in files:
-                if file['name'].lower().startswith(project_name.lower()):
-                    if 'adapter_content' in file['name'].lower():
-                        data_images['adapter_content'] = self._download_file(file,"image")
-                    elif 'average_base_calling_accuracy' in file['name'].lower():
-                        data_images['average_base_calling_accuracy'] = self._download_file(file,"image")
-                    elif 'basecoverage' in file['name'].lower():
-                        data_images['basecoverage'] = self._download_file(file,"image")
-                    elif 'per_base_quality' in file['name'].lower():
-                        data_images['per_base_quality'] = self._download_file(file,"image")
-                    elif file['name'].lower().endswith('validation_data.json'):
-                        json_data = self._download_file(file,"json")
+
+            # Download all files at once; the JSON is parsed and the statistics
+            # calculated as soon as it arrives, while the plots are still downloading
+            pool = _validation_download_pool
+            json_future = pool.submit(self._download_file, json_file, "json") if json_file else None
+            image_futures = {image: pool.submit(self._download_file, file, "image")
+                             for image, file in image_files.items()}
+
+            json_data = json_future.result() if json_future else {}
+            statistics = calculate_statistics(json_data) if json_data else {}
+            data_images = {image: future.result() for image, future in image_futures.items()}
             
             print("json_data", json_data)
-            return data_images,json_data
+            return data_images,json_data,statistics
             
         except Exception as e:
             print(f"Error getting logos: {str(e)}")
             return None
         
 
+    def source_versions(self, report_data):
+        """Versions of the logos and of the project's validation data, or None if not known yet."""
+        logos = folder_versions(self.handler.config.get_logo_folder_id())
+        project = report_data['project'].strip().lower()
+        validation_data = folder_versions(self.handler.config.get_validation_data_folder_id(),
+                                          lambda file: project_code(file['name']) == project)
+        if logos is None or validation_data is None:
+            return None
+        return logos + validation_data
+
     def _download_file(self, file,what):
         """Helper method to download and convert logo to base64."""
         try:
-            request = self.handler.service.files().get_media(fileId=file['id'])
-            file_bytes = BytesIO()
-            downloader = MediaIoBaseDownload(file_bytes, request)
-            
-            done = False
-            while not done:
-                _, done = downloader.next_chunk()
-            
-            # Return as base64 data URL
+            # Images as data URLs or exported files, see report_output.resolve_asset_mode
             if what == 'image':
-                logo_data = base64.b64encode(file_bytes.getvalue()).decode()
-                return f"data:{file['mimeType']};base64,{logo_data}"
+                return asset_url(self.handler.service, file)
             elif what == 'json':
-                file_bytes.seek(0)
-                return json.load(file_bytes)    
+                return json.loads(get_asset_cache().get_bytes(self.handler.service, file))
             
         except Exception as e:
             print(f"Error downloading logo {file['name']}: {str(e)}")
             return None        
 
 
-    def generate_html(self, report_data):
-        """Generate HTML content from template and report data."""
+    def generate_html(self, report_data, progress=no_progress):
+        """Generate HTML content from template and report data.
+
+        progress is called with each stage as it starts, and may raise
+        ReportCancelled to stop.
+        """
         try:
             # Get both logos
+            progress(STAGE_ASSETS)
             logos = self.get_logos()
 
             # Get data images and validation json with all values for the report                                                                                     
-            val_data_images, val_json = self.get_val_data_images_and_json(report_data['project'])
+            val_data_images, val_json, stats = self.get_val_data_images_and_json(report_data['project'])
+            # Images that failed to download, see report_memo.is_complete
+            report_data['missing_assets'] = (['logos'] if logos is None
+                                              else [name for name, logo in logos.items() if logo is None])
+            report_data['missing_assets'] += [image for image, url in val_data_images.items() if url is None]
 
-            # Read template
-            with open(self.template_path, 'r', encoding='utf-8') as f:
-                template = f.read()
-            
             # Format samples and templates lists
             samples_list = report_data.get('selected_samples')
             samples_list = [x.split(' (')[1].strip(')') for x in samples_list]
@@ -146,22 +195,11 @@ class VAL_HTMLGenerator:
             basecoverage_img = val_data_images['basecoverage'] if val_data_images and 'basecoverage' in val_data_images else ''
             per_base_quality_img = val_data_images['per_base_quality'] if val_data_images and 'per_base_quality' in val_data_images else '' 
 
-            # Calculate Statistics for the report
-            #Number of bases sequenced in Mb = number of reads (in fastqc file) x 2 (if paired end) x read length (in fastqc file) bases ---- convert to Mb
-            bases_sequenced_bp = val_json['Number_of_reads'] * val_json['Paired_end']
-            bases_sequenced_in_Mb = ((val_json['Number_of_reads'] * val_json['Paired_end'] * val_json['Read_length']) / 1e6)
-            total_number_of_bases = val_json['Read_length'] * val_json['Number_of_reads'] * val_json['Paired_end']
-            expected_coverage = total_number_of_bases / (val_json['Genome_size_Kb'] * 1e3)
-            #X coverage of sequenced data =( Number of bases sequenced in Mb (above calc) * 1000000  (if converted to Mb)) / Genome size in bp (in json file)
-            coverage = (bases_sequenced_in_Mb * 1e6) / (val_json['Genome_size_Kb'] * 1e3)
-            
-
-            with open(self.stylesheet) as f:
-                css = f.read()
 
             # Replace placeholders
-            html_content = template.format(
-                css = css,
+            progress(STAGE_RENDERING)
+            html_content = self.template.render(
+                css = self.css + logo_css(company_logo),
                 dna_img = dna_img,
                 company_logo=company_logo,
 
@@ -172,14 +210,14 @@ class VAL_HTMLGenerator:
                 tech = val_json['Technician'],
                 genome_size = val_json['Genome_size_Kb'],
                 genome_size_in_bp  = val_json['Genome_size_Kb'] * 1e3,
-                bases_sequenced_in_Mb = round(bases_sequenced_in_Mb,2),
+                bases_sequenced_in_Mb = round(stats['bases_sequenced_in_Mb'],2),
                 
-                coverage =round(coverage,2),
+                coverage =round(stats['coverage'],2),
                 alignment_stats = val_json['Alignment_statistics'].replace('\n', '<br><br>'),
                 read_length = val_json['Read_length'],
-                bases_sequenced_bp = bases_sequenced_bp,
-                total_number_of_bases = total_number_of_bases,
-                expected_coverage = round(expected_coverage,2),
+                bases_sequenced_bp = stats['bases_sequenced_bp'],
+                total_number_of_bases = stats['total_number_of_bases'],
+                expected_coverage = round(stats['expected_coverage'],2),
 
                 adapter_content_img=adapter_content_img,
                 average_base_calling_accuracy_img=average_base_calling_accuracy_img,
@@ -205,7 +243,9 @@ class VAL_HTMLGenerator:
             )
             # print(html_content)
             return html_content
-            
+
+        except ReportCancelled:
+            raise
         except Exception as e:
             print(f"Error generating HTML: {str(e)}")
             return None
\ No newline at end of file
@@ -0,0 +1,113 @@
+from drive_sync import get_drive_sync
+import os
+import threading
+
+# QC plots of a validation run, named <project code>_<plot>.<ext>
+VAL_DATA_IMAGES = ('adapter_content', 'average_base_calling_accuracy', 'basecoverage', 'per_base_quality')
+# The run's statistics, <project code>_validation_data.json
+VAL_DATA_JSON = 'validation_data.json'
+# Separators between the project code and the rest of a file name
+_NAME_SEPARATORS = '_- .'
+
+
+def project_code(file_name):
+    """The (lower-case) project code a validation file belongs to, parsed from its name.
+
+    It is what precedes the plot name or validation_data; for other files,
+    what precedes the first underscore. Project codes may contain
+    underscores themselves, so this is not simply the first field.
+    """
+    name = file_name.lower()
+    markers = VAL_DATA_IMAGES + (os.path.splitext(VAL_DATA_JSON)[0],)
+    positions = [position for position in (name.find(marker) for marker in markers) if position > 0]
+    if positions:
+        return name[:min(positions)].rstrip(_NAME_SEPARATORS)
+    return os.path.splitext(name)[0].split('_')[0]
+
+
+class ValidationDataIndex:
+    """Lookup of validation-data files by project code.
+
+    Validation files are named after the project they belong to (see
+    project_code), so the index maps each project code to its files: a
+    lookup is a dictionary access, whatever the number of runs in the
+    folder, and P1 does not pick up the files of P10. It is built once
+    from the local mirror of the folder (see DriveFolderSync) and then
+    updated from each sync's delta.
+    """
+
+    def __init__(self, folder_id, sync=None):
+        self.folder_id = folder_id
+        self.sync = sync or get_drive_sync()
+        self._lock = threading.Lock()
+        self._projects = None  # project code -> {file id: file}
+        self._codes = {}  # file id -> project code
+        self.sync.add_listener(self._on_sync)
+
+    def _add(self, file):
+        code = project_code(file['name'])
+        self._codes[file['id']] = code
+        self._projects.setdefault(code, {})[file['id']] = file
+
+    def _rebuild(self, files):
+        self._projects = {}
+        self._codes = {}
+        for file in files:
+            self._add(file)
+
+    def _remove(self, file_id):
+        code = self._codes.pop(file_id, None)
+        if code is not None:
+            files = self._projects[code]
+            files.pop(file_id, None)
+            if not files:
+                del self._projects[code]
+
+    def _on_sync(self, delta):
+        changes = delta.get(self.folder_id)
+        if changes is None:
+            return
+        with self._lock:
+            if self._projects is None:
+                return
+            for file in changes['removed'] + changes['modified']:
+                self._remove(file['id'])
+            for file in changes['added'] + changes['modified']:
+                self._add(file)
+
+    def _lookup(self, service, project_name):
+        if self.sync.ensure_folder(service, self.folder_id) or self._projects is None:
+            files = self.sync.folder_files(service, self.folder_id)
+            with self._lock:
+                self._rebuild(files)
+
+        with self._lock:
+            files = self._projects.get(project_name.strip().lower(), {})
+            return sorted(files.values(), key=lambda file: file['name'].lower())
+
+    def project_files(self, service, project_name):
+        """Return the files of the project whose code is project_name (case-insensitive).
+
+        The mirror is synced first (see DriveFolderSync.refresh), and synced
+        again if nothing matches, so runs uploaded while the app is open are
+        found.
+        """
+        self.sync.refresh(service)
+        matches = self._lookup(service, project_name)
+        if not matches:
+            # Possibly uploaded since the last sync
+            self.sync.sync(service)
+            matches = self._lookup(service, project_name)
+        return matches
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_validation_index(folder_id):
+    """Return the process-wide ValidationDataIndex of a folder, creating it on first use."""
+    with _indexes_lock:
+        if folder_id not in _indexes:
+            _indexes[folder_id] = ValidationDataIndex(folder_id)
+        return _indexes[folder_id]